@@ -0,0 +1,225 @@
+"""Runs full account runs against the local fake Discord and reports where the time went.
+
+Drives Firefox through geckodriver like the officiant itself, or with --in-memory an in-process
+fake browser that needs neither, counting the same WebDriver commands. Run from the repository
+root:
+    python -m benchmarks.end_to_end --accounts 1 --servers 1
+    python -m benchmarks.end_to_end --accounts 4 --servers 3 --workers 4 --warm --runs 2
+    python -m benchmarks.end_to_end --in-memory --accounts 8 --servers 4 --workers 4
+"""
+
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from pathlib import Path
+import tempfile
+from threading import Lock
+from time import perf_counter
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from benchmarks.fake_discord import FakeDiscord, user_js_for
+from benchmarks.fake_webdriver import fake_driver
+from constants import Command, Wait
+import discord_elements
+from discord_elements import Account, AccountOptions, Server, ServerOptions
+from profiling import PROFILER
+import sessions as sessions_module
+from sessions import SessionManager
+
+SERVER_PHASES = [
+    "_roll_in_new_browser",
+    "_wait_for_coast_to_clear",
+    "get_timers_up",
+    "_do_non_rolls",
+    "_do_rolls",
+    "claim_best_available",
+]
+
+
+class Measurements:
+    """Wall time per phase and per WebDriver command, shared by every thread in a run."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.phases: dict[str, list[float]] = defaultdict(list)
+        self.commands: dict[str, list[float]] = defaultdict(list)
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name].append(seconds)
+
+    def add_command(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.commands[name].append(seconds)
+
+    def timed(self, name: str, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_phase(name, perf_counter() - started)
+
+        return wrapper
+
+    def report(self, title: str) -> None:
+        print(f"\n{title}")
+        print(f"{'phase':<28}{'count':>7}{'total s':>10}{'mean ms':>10}")
+        for name, times in sorted(self.phases.items(), key=lambda i: -sum(i[1])):
+            print(f"{name:<28}{len(times):>7}{sum(times):>10.2f}{sum(times) / len(times) * 1000:>10.1f}")
+        total = sum(len(t) for t in self.commands.values())
+        print(f"\n{'webdriver command':<28}{'count':>7}{'total s':>10}{'mean ms':>10}")
+        for name, times in sorted(self.commands.items(), key=lambda i: -len(i[1])):
+            print(f"{name:<28}{len(times):>7}{sum(times):>10.2f}{sum(times) / len(times) * 1000:>10.1f}")
+        print(f"{'all commands':<28}{total:>7}")
+
+
+IN_MEMORY_URL = "http://fake-discord.invalid"
+
+
+class BenchmarkAccount(Account):
+    """An account with a throwaway Firefox profile whose WebDriver commands are measured.
+    With in_memory set, its browser is a fake one answered by that FakeDiscord instead."""
+
+    measurements: Measurements
+    in_memory: FakeDiscord | None = None
+    command_latency: float = 0.0
+
+    def __init__(self, name: str, profile_root: Path, options: AccountOptions) -> None:
+        profile = profile_root / name
+        profile.mkdir(parents=True, exist_ok=True)
+        (profile / "user.js").write_text(user_js_for(name), encoding="utf-8")
+        super().__init__(name, str(profile), options)
+
+    def get_firefox_browser(self) -> WebDriver:
+        started = perf_counter()
+        if self.in_memory is not None:
+            browser = fake_driver(self.in_memory, self.name, self.command_latency)
+            browser.implicitly_wait(Wait.DEFAULT_TIME_OUT)
+            browser = PROFILER.wrap(browser)
+        else:
+            browser = super().get_firefox_browser()
+        self.measurements.add_phase("browser start", perf_counter() - started)
+        execute = browser.execute
+        measurements = self.measurements
+
+        def counted_execute(driver_command, params=None):
+            started = perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                measurements.add_command(driver_command, perf_counter() - started)
+
+        browser.execute = counted_execute
+        return browser
+
+
+def instrument(servers: list[Server], measurements: Measurements) -> None:
+    for server in servers:
+        for phase in SERVER_PHASES:
+            setattr(server, phase, measurements.timed(phase, getattr(server, phase)))
+        for account in server.accounts:
+            account.measurements = measurements
+    discord_elements.get_user_display_name = measurements.timed(
+        "get_user_display_name", discord_elements.get_user_display_name
+    )
+    discord_elements.Channel.send = measurements.timed(
+        "Channel.send", discord_elements.Channel.send
+    )
+    sessions_module.BrowserSession.open = measurements.timed(
+        "BrowserSession.open", sessions_module.BrowserSession.open
+    )
+
+
+def build(
+    args, base_url: str, profile_root: Path, fake: FakeDiscord | None = None
+) -> list[Server]:
+    options = AccountOptions(
+        roll_order=[Command.ROLL_WAIFU_ANIMANGA, Command.ROLL_ANY],
+        headless=not args.show_browser,
+        roll_pipeline_depth=args.pipeline_depth,
+        fast_command_input=args.fast_input,
+    )
+    accounts = [
+        BenchmarkAccount(f"bench{i}", profile_root, options) for i in range(args.accounts)
+    ]
+    if args.in_memory:
+        for account in accounts:
+            account.in_memory = fake
+            account.command_latency = args.command_latency
+    return [
+        Server(
+            name=f"Fake {i}",
+            server_id=1000 + i,
+            roll_channel_id=2000 + i,
+            minute_of_hour_to_roll=0,
+            accounts=accounts,
+            options=ServerOptions(max_workers=args.workers),
+            base_url=base_url,
+        )
+        for i in range(args.servers)
+    ]
+
+
+def run(args) -> None:
+    Wait.COAST_IS_CLEAR = args.coast_is_clear
+    fake = FakeDiscord(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    base_url = IN_MEMORY_URL if args.in_memory else fake.start()
+    sessions = SessionManager() if args.warm else None
+    try:
+        with tempfile.TemporaryDirectory(prefix="officiant-bench-") as profile_root:
+            servers = build(args, base_url, Path(profile_root), fake)
+            measurements = Measurements()
+            instrument(servers, measurements)
+            for run_number in range(1, args.runs + 1):
+                measurements.reset()
+                fake.new_hour()
+                started = perf_counter()
+                with ThreadPoolExecutor(max_workers=len(servers)) as pool:
+                    list(pool.map(lambda s: s.do_rolls(sessions), servers))
+                elapsed = perf_counter() - started
+                measurements.report(
+                    f"Run {run_number}: {args.accounts} account(s) x {args.servers} server(s) "
+                    f"in {elapsed:.2f}s"
+                )
+            print(f"\nCommands answered by the fake: {fake.commands_answered}")
+    finally:
+        if sessions is not None:
+            sessions.close_all()
+        fake.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--servers", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="accounts rolled at once per server")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--warm", action="store_true", help="reuse browsers between runs")
+    parser.add_argument("--fast-input", action="store_true", help="enter commands in one step")
+    parser.add_argument("--pipeline-depth", type=int, default=1, help="rolls in flight at once")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before Mudae answers")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--coast-is-clear", type=float, default=1.0, help="quiet seconds to wait for")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--show-browser", action="store_true")
+    parser.add_argument(
+        "--in-memory", action="store_true", help="use a fake browser instead of Firefox"
+    )
+    parser.add_argument(
+        "--command-latency",
+        type=float,
+        default=0.002,
+        help="seconds each WebDriver command takes with --in-memory",
+    )
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""A local stand-in for a Discord channel with Mudae in it, for measuring runs offline.
+
+The page served at /channels/<server_id>/<channel_id> mimics the parts of the Discord web app
+the officiant relies on: the textbox and its slash command popups, chat message items with
+time elements and buttons, the name tag, and the add reaction context menu. Messages live
+in this process, so several browsers can share a channel.
+
+Browsers identify themselves with a user agent ending in "OfficiantFake/<name>", which
+benchmarks set in the Firefox profile with user_js_for().
+"""
+
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import random
+import re
+from threading import Condition, Lock, Thread, Timer
+
+from constants import ButtonAction, Command
+
+PAGE_PATH = Path(__file__).with_name("fake_discord_page.html")
+USER_AGENT_MARKER = "OfficiantFake/"
+MUDAE = "Mudae"
+ROLL_COMMANDS = {c.value for c in Command if c.name.startswith("ROLL")}
+KAKERA_REACTS = [b.value for b in ButtonAction if b != ButtonAction.WISH]
+CHARACTERS = [
+    ("Rem", "Re:Zero kara Hajimeru Isekai Seikatsu"),
+    ("Megumin", "Kono Subarashii Sekai ni Shukufuku wo!"),
+    ("Zero Two", "Darling in the FranXX"),
+    ("Asuka Langley Soryu", "Neon Genesis Evangelion"),
+    ("Makise Kurisu", "Steins;Gate"),
+    ("Holo", "Spice and Wolf"),
+    ("Mikasa Ackerman", "Shingeki no Kyojin"),
+    ("Nezuko Kamado", "Kimetsu no Yaiba"),
+    ("Power", "Chainsaw Man"),
+    ("2B", "NieR:Automata"),
+]
+
+
+def user_js_for(name: str) -> str:
+    """Firefox prefs that make a profile identify itself to the fake as name."""
+    return (
+        'user_pref("general.useragent.override", '
+        f'"Mozilla/5.0 (X11; Linux x86_64) {USER_AGENT_MARKER}{name}");\n'
+    )
+
+
+class FakeUser:
+    """Timers for one user, shaped like the $tu output the officiant reads."""
+
+    name: str
+    can_claim: bool
+    can_rt: bool
+    rolls_left: int
+    can_daily: bool
+    can_daily_kakera: bool
+    can_pokeslot: bool
+    kakera_power: int
+
+    def __init__(self, name: str, rolls_per_hour: int) -> None:
+        self.name = name
+        self.can_claim = True
+        self.can_rt = True
+        self.rolls_left = rolls_per_hour
+        self.can_daily = True
+        self.can_daily_kakera = True
+        self.can_pokeslot = True
+        self.kakera_power = 100
+
+    def timers_up(self) -> str:
+        claim = (
+            f"{self.name}, you __can__ claim right now! The next claim reset is in **42** min."
+            if self.can_claim
+            else f"{self.name}, you can't claim for another **42** min."
+        )
+        return "\n".join(
+            [
+                claim,
+                f"You have **{self.rolls_left}** rolls left. Next rolls reset in **21** min.",
+                "$rt is available!" if self.can_rt else "The cooldown of $rt is not over.",
+                "You have **3** rolls reset in stock.",
+                "",
+                "You __can__ react to kakera right now!",
+                f"Power: **{self.kakera_power}%**",
+                "Each kakera reaction consumes 34% of your reaction power.",
+                "Your characters with 10+ keys consume half the power (17%)",
+                "Stock: **1234**:kakera:",
+                "",
+                "$dk is ready!" if self.can_daily_kakera else "Next $dk in **3h 12** min.",
+                "$daily is available!" if self.can_daily else "Next $daily reset in **6h 36** min.",
+                "You may vote right now!",
+                "$p is available!" if self.can_pokeslot else "Remaining time before your next $p: **59** min.",
+            ]
+        )
+
+
+class FakeChannel:
+    """The messages of one channel. version increases on every change so pages can catch up."""
+
+    channel_id: str
+    messages: dict[str, dict]
+    version: int
+    changed: Condition
+
+    def __init__(self, channel_id: str) -> None:
+        self.channel_id = channel_id
+        self.messages = {}
+        self.version = 0
+        self.changed = Condition()
+
+    def post(self, **fields) -> dict:
+        with self.changed:
+            self.version += 1
+            message_id = str(1_000_000_000_000_000 + self.version)
+            message = {
+                "id": message_id,
+                "author": MUDAE,
+                "bot": True,
+                "invoker": None,
+                "command": None,
+                "lines": [],
+                "buttons": [],
+                "owner": None,
+                "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                "version": self.version,
+                **fields,
+            }
+            self.messages[message_id] = message
+            self.changed.notify_all()
+            return message
+
+    def edit(self, message_id: str, **fields) -> dict | None:
+        with self.changed:
+            message = self.messages.get(message_id)
+            if message is None:
+                return None
+            self.version += 1
+            message.update(fields, version=self.version)
+            self.changed.notify_all()
+            return message
+
+    def updates(self, since: int, timeout: float) -> tuple[int, list[dict]]:
+        with self.changed:
+            self.changed.wait_for(lambda: self.version > since, timeout)
+            changed = [m for m in self.messages.values() if m["version"] > since]
+            return self.version, changed
+
+
+class FakeDiscord:
+    """Serves fake channels and answers commands the way Mudae would, after a delay.
+
+    latency: seconds before Mudae answers a command
+    jitter: up to this many extra seconds, chosen at random per command
+    wish_rate: chance a roll is wished by the user who rolled it
+    kakera_rate: chance a roll has a kakera button
+    """
+
+    latency: float
+    jitter: float
+    wish_rate: float
+    kakera_rate: float
+    rolls_per_hour: int
+    commands_answered: dict[str, int]
+
+    def __init__(
+        self,
+        latency: float = 0.3,
+        jitter: float = 0.1,
+        wish_rate: float = 0.1,
+        kakera_rate: float = 0.3,
+        rolls_per_hour: int = 10,
+        seed: int | None = None,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.wish_rate = wish_rate
+        self.kakera_rate = kakera_rate
+        self.rolls_per_hour = rolls_per_hour
+        self.commands_answered = {}
+        self._random = random.Random(seed)
+        self._channels: dict[str, FakeChannel] = {}
+        self._users: dict[str, FakeUser] = {}
+        self._lock = Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self.page = PAGE_PATH.read_text(encoding="utf-8")
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        fake = self
+
+        class Handler(FakeDiscordHandler):
+            discord = fake
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def new_hour(self) -> None:
+        """Resets every user's timers, as if the next roll reset had passed."""
+        with self._lock:
+            self._users.clear()
+
+    def channel(self, channel_id: str) -> FakeChannel:
+        with self._lock:
+            if channel_id not in self._channels:
+                channel = FakeChannel(channel_id)
+                channel.post(
+                    author="Clyde",
+                    lines=["Welcome to the channel!"],
+                    time="2020-01-01T00:00:00.000+00:00",
+                )
+                self._channels[channel_id] = channel
+            return self._channels[channel_id]
+
+    def user(self, name: str) -> FakeUser:
+        with self._lock:
+            if name not in self._users:
+                self._users[name] = FakeUser(name, self.rolls_per_hour)
+            return self._users[name]
+
+    def send(self, channel_id: str, user_name: str, body: dict) -> None:
+        channel = self.channel(channel_id)
+        if body.get("kind") != "command":
+            channel.post(author=user_name, bot=False, lines=[body.get("text", "")])
+            return
+        command = body["command"]
+        placeholder = channel.post(
+            invoker=user_name, command=command, lines=["Sending command..."]
+        )
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        Timer(
+            delay,
+            self._answer,
+            (channel, placeholder["id"], self.user(user_name), command, body.get("param")),
+        ).start()
+
+    def click(self, channel_id: str, user_name: str, message_id: str, action: str) -> None:
+        channel = self.channel(channel_id)
+        message = channel.messages.get(message_id)
+        if message is None or action not in message["buttons"]:
+            return
+        if action == ButtonAction.WISH.value:
+            self._claim(channel, self.user(user_name), message)
+        else:
+            buttons = [b for b in message["buttons"] if b != action]
+            channel.edit(message_id, buttons=buttons)
+            channel.post(lines=[f"{user_name} +{self._random.randint(50, 900)} :{action}:"])
+
+    def react(self, channel_id: str, user_name: str, message_id: str, emoji: str) -> None:
+        channel = self.channel(channel_id)
+        message = channel.messages.get(message_id)
+        if message is not None and message["command"] in ROLL_COMMANDS:
+            self._claim(channel, self.user(user_name), message)
+
+    def _claim(self, channel: FakeChannel, user: FakeUser, message: dict) -> None:
+        if message["owner"] is not None or not user.can_claim:
+            return
+        user.can_claim = False
+        channel.edit(
+            message["id"],
+            owner=user.name,
+            lines=message["lines"] + [f"Belongs to {user.name}"],
+            buttons=[b for b in message["buttons"] if b != ButtonAction.WISH.value],
+        )
+        channel.post(lines=[f"💖 {user.name} and {message['character']} are now married! 💖"])
+
+    def _answer(
+        self,
+        channel: FakeChannel,
+        message_id: str,
+        user: FakeUser,
+        command: str,
+        param: str | None,
+    ) -> None:
+        self.commands_answered[command] = self.commands_answered.get(command, 0) + 1
+        buttons = []
+        character = None
+        if command == Command.TIMERS_UP:
+            lines = user.timers_up().splitlines()
+        elif command in ROLL_COMMANDS:
+            lines, buttons, character = self._roll(user, command)
+        elif command == Command.DAILY:
+            user.can_daily = False
+            lines = ["✅"]
+        elif command == Command.DAILY_KAKERA:
+            user.can_daily_kakera = False
+            lines = [f"+{self._random.randint(100, 300)}:kakera:"]
+        elif command == Command.POKESLOT:
+            user.can_pokeslot = False
+            lines = ["You didn't win anything."]
+        elif command == Command.RESET_CLAIM_TIMER:
+            user.can_rt = False
+            user.can_claim = True
+            lines = ["The claim timer has been reset."]
+        else:
+            lines = [f"{command} {param or ''}".strip()]
+        channel.edit(message_id, lines=lines, buttons=buttons, character=character)
+
+    def _roll(
+        self, user: FakeUser, command: str
+    ) -> tuple[list[str], list[str], str | None]:
+        if command != Command.ROLL_KAKERA:
+            if user.rolls_left <= 0:
+                limit = f"{user.name}, the roulette is limited to {self.rolls_per_hour} uses per hour."
+                return [limit], [], None
+            user.rolls_left -= 1
+        name, series = self._random.choice(CHARACTERS)
+        kakera = self._random.randint(30, 1200)
+        lines = []
+        buttons = []
+        if self._random.random() < self.wish_rate:
+            lines.append(f"Wished by {user.name}")
+            buttons.append(ButtonAction.WISH.value)
+        lines += [name, series, f"Claims: #{self._random.randint(1, 20000)}", str(kakera)]
+        lines.append(f"{name} / {series} - {kakera} ka")
+        if self._random.random() < self.kakera_rate:
+            buttons.append(self._random.choice(KAKERA_REACTS))
+        return lines, buttons, name
+
+
+class FakeDiscordHandler(BaseHTTPRequestHandler):
+    discord: FakeDiscord
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        match = re.fullmatch(r"/channels/(\d+)/(\d+)", self.path)
+        if match:
+            self._send_page(match.group(2))
+            return
+        match = re.fullmatch(r"/api/channels/(\d+)/messages\?since=(\d+)", self.path)
+        if match:
+            version, messages = self.discord.channel(match.group(1)).updates(
+                int(match.group(2)), timeout=10
+            )
+            self._send_json({"version": version, "messages": messages})
+            return
+        self.send_error(404)
+
+    def do_POST(self) -> None:
+        match = re.fullmatch(r"/api/channels/(\d+)/(send|click|react)", self.path)
+        if not match:
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        channel_id, action = match.groups()
+        user = body.get("user", "")
+        if action == "send":
+            self.discord.send(channel_id, user, body)
+        elif action == "click":
+            self.discord.click(channel_id, user, body["message_id"], body["action"])
+        else:
+            self.discord.react(channel_id, user, body["message_id"], body["emoji"])
+        self._send_json({"ok": True})
+
+    def _send_page(self, channel_id: str) -> None:
+        agent = self.headers.get("User-Agent", "")
+        user = agent.split(USER_AGENT_MARKER, 1)[-1] if USER_AGENT_MARKER in agent else "guest"
+        self.discord.channel(channel_id)
+        config = {
+            "user": user,
+            "channelId": channel_id,
+            "commands": sorted((c.value for c in Command if c.value.startswith("/")), key=len, reverse=True),
+        }
+        page = self.discord.page.replace("/*CONFIG*/{}", json.dumps(config))
+        self._send(page.encode("utf-8"), "text/html; charset=utf-8")
+
+    def _send_json(self, payload: dict) -> None:
+        self._send(json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _send(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+__all__ = ["FakeDiscord", "user_js_for"]
@@ -0,0 +1,565 @@
+"""An in-memory stand-in for Firefox and geckodriver, so benchmarks run where neither is installed.
+
+FakeBrowser takes the place of the connection a WebDriver sends its commands through. It
+answers them from a FakeDiscord in this process, the way fake_discord_page.html would: the
+same message items, text box popups, buttons and add reaction menu. Scripts from page_scripts
+are recognized by their text and carried out in Python, so what the officiant does is real,
+down to every WebDriver command it sends, but the page scripts themselves are not exercised.
+The in-page claim agent is not supported and reports that it couldn't start.
+"""
+
+from datetime import datetime
+from itertools import count
+import re
+from threading import Lock
+from time import monotonic, sleep, time
+from urllib.parse import urlsplit
+
+from selenium import webdriver
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.firefox.options import Options
+
+from benchmarks.fake_discord import FakeChannel, FakeDiscord
+from constants import Command
+import page_scripts
+from sessions import NAVIGATE_IN_PLACE_JS
+
+ELEMENT_KEY = "element-6066-11e4-a52e-4f735466cecf"
+RETURN_KEYS = (Keys.RETURN, Keys.ENTER)
+SLASH_COMMANDS = sorted(
+    (c.value for c in Command if c.value.startswith("/")), key=len, reverse=True
+)
+EMOJI_NAMES = ["game_die", "eyes", "white_check_mark", "money_bag", "heart"]
+LOADING = "Sending command..."
+
+
+def fake_driver(
+    discord: FakeDiscord, user: str, command_latency: float = 0.0
+) -> webdriver.Remote:
+    """A WebDriver for user whose every command is answered by a FakeBrowser."""
+    return webdriver.Remote(
+        command_executor=FakeBrowser(discord, user, command_latency), options=Options()
+    )
+
+
+class FakeError(Exception):
+    """A WebDriver error response, named like the protocol names it."""
+
+    def __init__(self, error: str, message: str = "") -> None:
+        super().__init__(message)
+        self.error = error
+        self.message = message
+
+
+class FakeTab:
+    """What one tab shows: a channel, the text box, popups and the observers installed in it."""
+
+    def __init__(self) -> None:
+        self.channel_id: str | None = None
+        self.observers: set[str] = set()
+        self.text = ""
+        self.selected_all = False
+        self.popup: str | None = None
+        self.reacting_to: str | None = None
+        self.hovered: str | None = None
+
+
+class FakeBrowser:
+    """Answers WebDriver commands for one user's browser from a FakeDiscord.
+
+    command_latency: seconds each command takes, standing in for the round trip to geckodriver
+    """
+
+    def __init__(self, discord: FakeDiscord, user: str, command_latency: float = 0.0) -> None:
+        self.discord = discord
+        self.user = user
+        self.command_latency = command_latency
+        self.implicit_wait = 0.0
+        self._handles = count(1)
+        self.tabs = {"tab-0": FakeTab()}
+        self.active = "tab-0"
+        self._lock = Lock()
+
+    @property
+    def tab(self) -> FakeTab:
+        return self.tabs[self.active]
+
+    def close(self) -> None:
+        pass
+
+    def execute(self, command: str, params: dict) -> dict:
+        if self.command_latency:
+            sleep(self.command_latency)
+        try:
+            with self._lock:
+                handler = getattr(self, f"_{command}", None)
+                if handler is None:
+                    raise FakeError("unknown command", f"{command} is not supported by the fake")
+                return {"value": handler(params)}
+        except FakeError as e:
+            return {"status": e.error, "value": {"error": e.error, "message": e.message}}
+
+    # session and windows
+
+    def _newSession(self, params: dict) -> dict:
+        return {"sessionId": f"fake-{self.user}", "capabilities": {"browserName": "fake"}}
+
+    def _quit(self, params: dict) -> None:
+        self.tabs.clear()
+
+    def _setTimeouts(self, params: dict) -> None:
+        if "implicit" in params:
+            self.implicit_wait = params["implicit"] / 1000
+
+    def _get(self, params: dict) -> None:
+        tab = FakeTab()
+        tab.channel_id = self._channel_in(params["url"])
+        self.tabs[self.active] = tab
+
+    def _w3cGetCurrentWindowHandle(self, params: dict) -> str:
+        return self.active
+
+    def _newWindow(self, params: dict) -> dict:
+        handle = f"tab-{next(self._handles)}"
+        self.tabs[handle] = FakeTab()
+        return {"handle": handle, "type": "tab"}
+
+    def _switchToWindow(self, params: dict) -> None:
+        if params["handle"] not in self.tabs:
+            raise FakeError("no such window", params["handle"])
+        self.active = params["handle"]
+
+    def _channel_in(self, url: str) -> str | None:
+        match = re.fullmatch(r"/channels/(\d+)/(\d+)/?", urlsplit(url).path)
+        if match:
+            self.discord.channel(match.group(2))
+            return match.group(2)
+        return None
+
+    # elements
+
+    def _findElement(self, params: dict) -> dict:
+        deadline = monotonic() + self.implicit_wait
+        while True:
+            element_id = self._find(params["using"], params["value"])
+            if element_id is not None:
+                return {ELEMENT_KEY: element_id}
+            if monotonic() >= deadline:
+                raise FakeError("no such element", params["value"])
+            self._lock.release()
+            try:
+                sleep(0.05)
+            finally:
+                self._lock.acquire()
+
+    def _findElements(self, params: dict) -> list[dict]:
+        element_id = self._find(params["using"], params["value"])
+        return [] if element_id is None else [{ELEMENT_KEY: element_id}]
+
+    def _find(self, using: str, value: str) -> str | None:
+        tab = self.tab
+        if using == "css selector":
+            match = re.fullmatch(r'\[id="(.+)"\]', value)
+            if match and self._message_for(match.group(1)) is not None:
+                return f"li|{match.group(1)}"
+            return None
+        if value == "//div[@role='textbox']":
+            return "textbox"
+        if value == "//div[starts-with(@class, 'nameTag_')]":
+            return "name_tag"
+        if value == "//div[starts-with(@class, 'autocomplete_')]":
+            return "popup" if tab.popup == "autocomplete" else None
+        if value == "//div[starts-with(@class, 'attachedBars_')]":
+            return "popup" if tab.popup == "attached_bars" else None
+        if value == "//div[@id='message-add-reaction']":
+            return "add_reaction" if tab.popup == "add_reaction" else None
+        if value == "//input[@aria-label='Search emoji']":
+            return "emoji_search" if tab.popup == "emoji_picker" else None
+        match = re.fullmatch(r"//button\[contains\(@data-name,'(.+)'\)\]", value)
+        if match:
+            if tab.popup != "emoji_picker":
+                return None
+            name = next((n for n in EMOJI_NAMES if match.group(1) in n), None)
+            return None if name is None else f"emoji|{name}"
+        match = re.fullmatch(r"//li\[starts-with\(@id, 'chat-messages-(\d+)-'\)\]", value)
+        if match:
+            return "channel" if tab.channel_id == match.group(1) else None
+        raise FakeError("invalid selector", f"{value} is not supported by the fake")
+
+    def _getElementText(self, params: dict) -> str:
+        if params["id"] == "name_tag":
+            return f"{self.user}\nOnline"
+        return ""
+
+    def _clickElement(self, params: dict) -> None:
+        kind, _, rest = params["id"].partition("|")
+        tab = self.tab
+        if kind == "button":
+            html_id, action = rest.rsplit("|", 1)
+            message = self._message_for(html_id)
+            if message is None or action not in message["buttons"]:
+                raise FakeError("stale element reference", html_id)
+            self.discord.click(tab.channel_id, self.user, message["id"], action)
+        elif kind == "add_reaction":
+            tab.popup = "emoji_picker"
+        elif kind == "emoji":
+            self.discord.react(tab.channel_id, self.user, tab.reacting_to, rest)
+            tab.popup = None
+
+    def _sendKeysToElement(self, params: dict) -> None:
+        if params["id"] != "textbox":
+            return
+        for key in params["text"]:
+            self._press(key)
+
+    def _press(self, key: str) -> None:
+        tab = self.tab
+        if key in RETURN_KEYS:
+            self._enter()
+        elif key == Keys.ESCAPE:
+            tab.popup = None
+        elif key == Keys.BACKSPACE:
+            tab.text = "" if tab.selected_all else tab.text[:-1]
+            tab.selected_all = False
+            self._input()
+        elif key < Keys.NULL:
+            tab.text = ("" if tab.selected_all else tab.text) + key
+            tab.selected_all = False
+            self._input()
+
+    def _input(self) -> None:
+        """Shows popups like the fake page does on each edit of the text box."""
+        tab = self.tab
+        if tab.text == "/":
+            tab.popup = "autocomplete"
+        elif tab.text.startswith("/") and self._recognized(tab.text):
+            tab.popup = "attached_bars"
+        elif not tab.text.startswith("/"):
+            tab.popup = None
+
+    def _recognized(self, text: str) -> str | None:
+        return next((c for c in SLASH_COMMANDS if text.startswith(c + " ")), None)
+
+    def _enter(self) -> None:
+        tab = self.tab
+        text = tab.text
+        command = self._recognized(text) if tab.popup == "attached_bars" else None
+        if command:
+            param = text[len(command) + 1 :].strip() or None
+            self.discord.send(
+                tab.channel_id, self.user, {"kind": "command", "command": command, "param": param}
+            )
+        elif text.strip() and not text.startswith("/"):
+            self.discord.send(tab.channel_id, self.user, {"kind": "text", "text": text.strip()})
+        tab.text = ""
+        tab.popup = None
+
+    def _actions(self, params: dict) -> None:
+        control = False
+        sources = params["actions"]
+        for tick in range(max((len(s["actions"]) for s in sources), default=0)):
+            for source in sources:
+                if tick >= len(source["actions"]):
+                    continue
+                action = source["actions"][tick]
+                if source["type"] == "key" and action["type"] == "keyDown":
+                    if action["value"] == Keys.CONTROL:
+                        control = True
+                    elif control and action["value"].lower() == "a":
+                        self.tab.selected_all = True
+                    else:
+                        self._press(action["value"])
+                elif source["type"] == "key" and action["type"] == "keyUp":
+                    if action["value"] == Keys.CONTROL:
+                        control = False
+                elif source["type"] == "pointer" and action["type"] == "pointerMove":
+                    origin = action.get("origin")
+                    if isinstance(origin, dict):
+                        self.tab.hovered = origin[ELEMENT_KEY]
+                elif source["type"] == "pointer" and action["type"] == "pointerDown":
+                    if action.get("button") == 2 and (self.tab.hovered or "").startswith("li|"):
+                        self.tab.reacting_to = self.tab.hovered.split("-")[-1]
+                        self.tab.popup = "add_reaction"
+
+    def _clearActionState(self, params: dict) -> None:
+        pass
+
+    # scripts
+
+    def _w3cExecuteScript(self, params: dict):
+        return self._script(params["script"], params["args"], wait=False)
+
+    def _w3cExecuteScriptAsync(self, params: dict):
+        return self._script(params["script"], params["args"], wait=True)
+
+    def _script(self, script: str, args: list, wait: bool):
+        scripts = {
+            page_scripts.INSTALL_MESSAGE_OBSERVER_JS: self._install_observer,
+            page_scripts.EXTRACT_MESSAGES_JS: self._extract_messages,
+            page_scripts.EXTRACT_MESSAGE_BY_ID_JS: self._extract_message_by_id,
+            page_scripts.EXTRACT_MESSAGES_BY_ID_JS: self._extract_messages_by_id,
+            page_scripts.EXTRACT_ELEMENT_JS: self._extract_element,
+            page_scripts.FIND_BUTTON_JS: self._find_button,
+            page_scripts.INSTALL_CLAIM_AGENT_JS: lambda *args: False,
+            page_scripts.UNINSTALL_CLAIM_AGENT_JS: lambda *args: True,
+            page_scripts.DRAIN_AGENT_CLICKS_JS: lambda *args: [],
+            NAVIGATE_IN_PLACE_JS: self._navigate_in_place,
+            "return document.readyState": lambda: "complete",
+            "arguments[0].scrollIntoView();": lambda element: None,
+        }
+        waits = {
+            page_scripts.WAIT_FOR_RESPONSE_JS: self._wait_for_response,
+            page_scripts.WAIT_FOR_QUIET_JS: self._wait_for_quiet,
+            page_scripts.STREAM_MESSAGES_JS: self._stream_messages,
+            page_scripts.FAST_COMMAND_INPUT_JS: self._fast_command_input,
+        }
+        handler = (waits if wait else scripts).get(script)
+        if handler is None:
+            raise FakeError("javascript error", "script not supported by the fake")
+        if not wait:
+            return handler(*args)
+        # waiting scripts let go of the browser, like a page does while it waits
+        self._lock.release()
+        try:
+            return handler(*args)
+        finally:
+            self._lock.acquire()
+
+    def _channel(self, channel_id: str | None = None) -> FakeChannel | None:
+        channel_id = channel_id or self.tab.channel_id
+        if channel_id is None or channel_id != self.tab.channel_id:
+            return None
+        return self.discord.channel(channel_id)
+
+    def _messages(self, channel: FakeChannel) -> list[dict]:
+        with channel.changed:
+            return sorted(channel.messages.values(), key=lambda m: int(m["id"]))
+
+    def _message_for(self, html_id: str) -> dict | None:
+        match = re.fullmatch(r"chat-messages-(\d+)-(\d+)", html_id)
+        channel = self._channel(match.group(1)) if match else None
+        if channel is None:
+            return None
+        with channel.changed:
+            return channel.messages.get(match.group(2))
+
+    def _install_observer(self, channel_id: str) -> bool:
+        self.tab.observers.add(channel_id)
+        return True
+
+    def _extract_messages(self, channel_id: str, limit: int | None, known: dict | None):
+        channel = self._channel(channel_id)
+        if channel is None:
+            return []
+        messages = self._messages(channel)
+        newest = list(reversed(messages))
+        if limit is not None:
+            newest = newest[:limit]
+        return [snapshot(channel_id, m, messages, known) for m in newest]
+
+    def _extract_message_by_id(self, html_id: str, known: dict | None):
+        message = self._message_for(html_id)
+        if message is None:
+            return None
+        channel_id = html_id.split("-")[2]
+        return snapshot(channel_id, message, self._messages(self._channel(channel_id)), known)
+
+    def _extract_messages_by_id(self, html_ids: list[str], known: dict | None):
+        return [self._extract_message_by_id(html_id, known) for html_id in html_ids]
+
+    def _extract_element(self, element) -> dict | None:
+        return self._extract_message_by_id(element.id.partition("|")[2], None)
+
+    def _find_button(self, html_id: str, name: str):
+        message = self._message_for(html_id)
+        if message is None or name not in message["buttons"]:
+            return None
+        return {ELEMENT_KEY: f"button|{html_id}|{name}"}
+
+    def _fast_command_input(self, box, text: str, param: str | None, timeout_ms: int) -> bool:
+        self._lock.acquire()
+        try:
+            return self._insert_text(text, param)
+        finally:
+            self._lock.release()
+
+    def _insert_text(self, text: str, param: str | None) -> bool:
+        tab = self.tab
+        tab.text = text
+        tab.selected_all = False
+        self._input()
+        if tab.popup != "attached_bars":
+            return False
+        if param:
+            tab.text += param
+        return True
+
+    def _navigate_in_place(self, path: str) -> None:
+        self.tab.channel_id = self._channel_in(path)
+        self.tab.popup = None
+
+    def _observed(self, channel_id: str) -> FakeChannel | None:
+        """The channel, if this tab shows it and has its observer installed."""
+        with self._lock:
+            if channel_id not in self.tab.observers:
+                return None
+            return self._channel(channel_id)
+
+    def _wait_for_response(
+        self,
+        channel_id: str,
+        after_id: str,
+        command: str,
+        invoker: str | None,
+        timeout_ms: int,
+        skip_ids: list[str],
+        settle_ms: int = 0,
+    ) -> dict:
+        channel = self._observed(channel_id)
+        if channel is None:
+            return {"status": "missing"}
+        skip = set(skip_ids)
+
+        def find() -> dict | None:
+            for message in self._messages(channel):
+                html_id = f"chat-messages-{channel_id}-{message['id']}"
+                if int(message["id"]) <= int(after_id or 0) or html_id in skip:
+                    continue
+                if message["command"] != command or (invoker and message["invoker"] != invoker):
+                    continue
+                content = "\n".join(message["lines"])
+                if content.strip() == "" or content.startswith(LOADING):
+                    continue
+                return message
+            return None
+
+        message = wait_for(channel, find, timeout_ms / 1000)
+        if message is None:
+            return {"status": "timeout"}
+        if not message["buttons"] and settle_ms:
+            wait_for(channel, lambda: message["buttons"] or None, settle_ms / 1000)
+        html_id = f"chat-messages-{channel_id}-{message['id']}"
+        return {
+            "status": "found",
+            "element": {ELEMENT_KEY: f"li|{html_id}"},
+            "snapshot": snapshot(channel_id, message, self._messages(channel), None),
+        }
+
+    def _wait_for_quiet(
+        self,
+        channel_id: str,
+        quiet_ms: int,
+        ignore_invokers: list[str],
+        mudae_only: bool,
+        since: float | None,
+        timeout_ms: int,
+    ) -> dict:
+        channel = self._observed(channel_id)
+        if channel is None:
+            return {"status": "missing"}
+        ignored = set(ignore_invokers)
+
+        def counts(message: dict) -> bool:
+            from_mudae = message["command"] is not None or message.get("bot", False)
+            if mudae_only and not from_mudae:
+                return False
+            return not (message["invoker"] and message["invoker"] in ignored)
+
+        last_activity = since or 0
+        if not since:
+            for message in reversed(self._messages(channel)[-50:]):
+                if counts(message):
+                    last_activity = datetime.fromisoformat(message["time"]).timestamp() * 1000
+                    break
+        started = time() * 1000
+        with channel.changed:
+            seen = channel.version
+            while True:
+                now = time() * 1000
+                quiet_at = last_activity + quiet_ms
+                if now >= quiet_at:
+                    return {"status": "quiet", "last_activity": last_activity}
+                if now - started >= timeout_ms:
+                    return {"status": "busy", "last_activity": last_activity}
+                channel.changed.wait((min(quiet_at, started + timeout_ms) - now) / 1000)
+                changed = [m for m in channel.messages.values() if m["version"] > seen]
+                seen = channel.version
+                if any(counts(m) for m in changed):
+                    last_activity = time() * 1000
+
+    def _stream_messages(
+        self, channel_id: str, cursor: int | None, known: dict | None, timeout_ms: int
+    ) -> dict:
+        channel = self._observed(channel_id)
+        if channel is None:
+            return {"status": "missing"}
+        with channel.changed:
+            if cursor is None or cursor > channel.version:
+                return {"status": "started", "version": channel.version}
+            if not channel.changed.wait_for(lambda: channel.version > cursor, timeout_ms / 1000):
+                return {"status": "timeout", "version": channel.version}
+            messages = self._messages(channel)
+            changed = [m for m in messages if m["version"] > cursor]
+            return {
+                "status": "changed",
+                "version": channel.version,
+                "snapshots": [snapshot(channel_id, m, messages, known) for m in changed],
+            }
+
+
+def wait_for(channel: FakeChannel, check, timeout: float):
+    """Calls check whenever the channel changes until it returns something, or None on timeout."""
+    deadline = monotonic() + timeout
+    with channel.changed:
+        while True:
+            result = check()
+            if result is not None:
+                return result
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return None
+            channel.changed.wait(remaining)
+
+
+def inner_text_lines(message: dict) -> list[str]:
+    """The lines of a message item's innerText, as fake_discord_page.html renders it."""
+    if message["command"]:
+        header = ["@" + message["invoker"], " used ", message["command"], message["author"], "BOT"]
+    else:
+        header = [message["author"]] + (["BOT"] if message.get("bot") else [])
+    sent = datetime.fromisoformat(message["time"]).astimezone()
+    time_text = "Today at " + sent.strftime("%I:%M %p").lstrip("0")
+    return header + [time_text] + list(message["lines"])
+
+
+def snapshot(channel_id: str, message: dict, messages: list[dict], known: dict | None) -> dict:
+    """What officiantSnapshot returns for the message's item."""
+    html_id = f"chat-messages-{channel_id}-{message['id']}"
+    fingerprint = str(message["version"])
+    if known and known.get(html_id) == fingerprint:
+        return {"html_id": html_id, "fingerprint": fingerprint, "unchanged": True}
+    lines = inner_text_lines(message)
+    used = len(lines) > 2 and lines[1].strip() == "used"
+    prompt = None
+    if len(lines) > 1 and lines[1].strip() == "BOT":
+        earlier = [m for m in messages if int(m["id"]) < int(message["id"])][-10:]
+        for other in reversed(earlier):
+            if other["command"] or other.get("bot"):
+                continue
+            prompt = next((line.strip() for line in reversed(other["lines"]) if line.strip()), None)
+            break
+    return {
+        "html_id": html_id,
+        "lines": lines,
+        "invoker": lines[0].lstrip("@") if used else None,
+        "command": lines[2].strip() if used else None,
+        "content": "\n".join(lines[6:]) if used else "",
+        "datetime": message["time"],
+        "buttons": list(message["buttons"]),
+        "kakera_icon": False,
+        "prompt": prompt,
+        "fingerprint": fingerprint,
+    }
+
+
+__all__ = ["FakeBrowser", "fake_driver"]
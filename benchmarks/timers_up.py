@@ -0,0 +1,109 @@
+"""Measures TimersUp parsing throughput over /tu responses in several $tuarrange layouts.
+
+Run from the repository root: python -m benchmarks.timers_up
+"""
+
+from time import perf_counter
+
+from discord_elements import TimersUp
+
+DEFAULT_LAYOUT = """\
+**officiant**, you __can__ claim right now! The next claim reset is in **2h 21** min.
+You have **12** rolls left. Next rolls reset in **21** min.
+$rt is available!
+You have **64** rolls reset in stock.
+
+You __can__ react to kakera right now!
+Power: **77%**
+Each kakera reaction consumes 34% of your reaction power.
+Your characters with 10+ keys consume half the power (17%)
+Stock: **101,637**:kakera:
+
+$dk is ready!
+Next $daily reset in **6h 36** min.
+You may vote again in **15** min.
+Remaining time before your next $p: **59** min."""
+
+REORDERED_WITH_MK = """\
+**officiant**, you can't claim for another **1h 04** min.
+Remaining time before your next $p: **12** min.
+Stock: **982**:kakera:
+$daily is available!
+You have **10** rolls (+**3** $mk) left. Next rolls reset in **48** min.
+Power: **100%**
+Each kakera reaction consumes 36% of your reaction power.
+Next $dk in **3h 12** min.
+The cooldown of $rt is not over. Time remaining: **14h 12** min."""
+
+MINIMAL = """\
+**officiant**, you __can__ claim right now! The next claim reset is in **38** min.
+You have **5** rolls left. Next rolls reset in **38** min."""
+
+CORPUS = [
+    (
+        DEFAULT_LAYOUT,
+        {
+            "can_claim": True,
+            "claim_reset_minutes": 141,
+            "rolls_left": 12,
+            "can_rt": True,
+            "kakera_stock": 101637,
+            "can_daily_kakera": True,
+            "can_daily": False,
+            "rolls_reset_minutes": 21,
+            "daily_reset_minutes": 396,
+        },
+    ),
+    (
+        REORDERED_WITH_MK,
+        {
+            "can_claim": False,
+            "claim_reset_minutes": 64,
+            "rolls_left": 10,
+            "mk_rolls_left": 3,
+            "can_rt": False,
+            "can_daily": True,
+            "can_pokeslot": False,
+            "kakera_cost": 36,
+            "daily_kakera_reset_minutes": 192,
+            "pokeslot_reset_minutes": 12,
+        },
+    ),
+    (
+        MINIMAL,
+        {
+            "can_claim": True,
+            "claim_reset_minutes": 38,
+            "rolls_left": 5,
+            "kakera_power": 0,
+            "can_daily": False,
+        },
+    ),
+]
+
+
+def check_corpus() -> None:
+    for content, expected in CORPUS:
+        tu = TimersUp.from_content(content)
+        actual = {field: getattr(tu, field) for field in expected}
+        if actual != expected:
+            raise AssertionError(f"Parsed {actual}, expected {expected} from:\n{content}")
+
+
+def run(repeats: int = 20000) -> None:
+    check_corpus()
+    texts = [content for content, _ in CORPUS]
+    started = perf_counter()
+    for _ in range(repeats):
+        for content in texts:
+            TimersUp.from_content(content)
+    elapsed = perf_counter() - started
+    parsed = repeats * len(texts)
+    print(
+        f"{parsed} responses in {elapsed * 1000:.1f} ms, "
+        f"{elapsed / parsed * 1e6:.2f} us/response, {parsed / elapsed:,.0f} responses/s"
+    )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,62 @@
+"""Compares WishlistMatcher against scanning the wishlist as a plain list.
+
+Run from the repository root: python -m benchmarks.wishlist
+"""
+
+import random
+import string
+from time import perf_counter
+
+from wishlist import WishlistMatcher
+
+
+def random_name(rng: random.Random) -> str:
+    words = rng.randint(1, 3)
+    return " ".join(
+        rng.choice(string.ascii_uppercase)
+        + "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+        for _ in range(words)
+    )
+
+
+def time_lookups(lookup, queries: list[str]) -> tuple[float, int]:
+    started = perf_counter()
+    found = sum(1 for query in queries if lookup(query))
+    return perf_counter() - started, found
+
+
+def run(wishlist_size: int = 5000, lookups: int = 20000, seed: int = 1) -> None:
+    rng = random.Random(seed)
+    wishlist = [random_name(rng) for _ in range(wishlist_size)]
+    wishlist_series = [random_name(rng) for _ in range(wishlist_size // 5)]
+    queries = [
+        rng.choice(wishlist) if rng.random() < 0.1 else random_name(rng)
+        for _ in range(lookups)
+    ]
+
+    started = perf_counter()
+    matcher = WishlistMatcher(wishlist, wishlist_series)
+    build_time = perf_counter() - started
+    started = perf_counter()
+    fuzzy_matcher = WishlistMatcher(wishlist, wishlist_series, fuzzy_series_threshold=0.8)
+    fuzzy_build_time = perf_counter() - started
+
+    print(f"{wishlist_size} names, {len(wishlist_series)} series, {lookups} lookups")
+    print(f"build: {build_time * 1000:.1f} ms, with trigram index: {fuzzy_build_time * 1000:.1f} ms")
+    cases = [
+        ("list scan, names", lambda q: q in wishlist),
+        ("matcher, names", matcher.matches_name),
+        ("list scan, series", lambda q: q in wishlist_series),
+        ("matcher, series", matcher.matches_series),
+        ("matcher, fuzzy series", fuzzy_matcher.matches_series),
+    ]
+    for label, lookup in cases:
+        elapsed, found = time_lookups(lookup, queries)
+        print(
+            f"{label:<24} {elapsed * 1000:9.2f} ms total "
+            f"{elapsed / lookups * 1e6:8.3f} us/lookup {found:6} matched"
+        )
+
+
+if __name__ == "__main__":
+    run()
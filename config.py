@@ -0,0 +1,217 @@
+"""Builds accounts and servers from a TOML file and the wishlist files it names.
+
+ConfigStore reloads them when any of those files change, so edits apply from the next run
+without restarting. See config.example.toml for the format.
+"""
+
+import logging
+import os
+import tomllib
+from threading import Lock
+
+from constants import ButtonAction, Command, Emoji
+from discord_elements import Account, AccountOptions, Server, ServerOptions
+import exceptions as exc
+from wishlist import WishlistMatcher
+
+
+class RuntimeOptions:
+    """How main.py runs the officiant, from [runtime]. Only read at startup.
+
+    memory_limit_mb: restart a warm browser using more than this. 0 for no limit.
+    tab_per_server: keep one tab per server in each account's browser
+    planner_path: file the RunPlanner keeps timers in. Empty to roll every hour.
+    prewarm_seconds: get browsers ready this long before each run. 0 to not.
+    watch: claim and react to other people's rolls between runs
+    """
+
+    memory_limit_mb: int
+    tab_per_server: bool
+    planner_path: str
+    prewarm_seconds: float
+    watch: bool
+
+    def __init__(
+        self,
+        memory_limit_mb: int = 1500,
+        tab_per_server: bool = True,
+        planner_path: str = "timers.json",
+        prewarm_seconds: float = 60,
+        watch: bool = False,
+    ) -> None:
+        self.memory_limit_mb = memory_limit_mb
+        self.tab_per_server = tab_per_server
+        self.planner_path = planner_path
+        self.prewarm_seconds = prewarm_seconds
+        self.watch = watch
+
+
+class Config:
+    """Accounts by their key in the file, the servers, how to run, and every file read to
+    build them."""
+
+    accounts: dict[str, Account]
+    servers: list[Server]
+    runtime: RuntimeOptions
+    files: list[str]
+
+    def __init__(
+        self,
+        accounts: dict[str, Account],
+        servers: list[Server],
+        files: list[str],
+        runtime: RuntimeOptions | None = None,
+    ) -> None:
+        self.accounts = accounts
+        self.servers = servers
+        self.runtime = runtime or RuntimeOptions()
+        self.files = files
+
+
+def _enum(cls, value: str):
+    """Accepts either the value, like "/wa", or the name, like "ROLL_WAIFU_ANIMANGA"."""
+    try:
+        return cls(value)
+    except ValueError:
+        pass
+    try:
+        return cls[value]
+    except KeyError:
+        raise exc.InvalidConfigException(f"Unknown {cls.__name__}: {value}") from None
+
+
+class _ConfigLoader:
+    """Reads one version of the config. Wishlist files and matchers are read and built once
+    and shared by every account that names the same ones."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.files = [path]
+        self._lines: dict[str, list[str]] = {}
+        self._matchers: dict[tuple, WishlistMatcher] = {}
+
+    def load(self) -> Config:
+        with open(self.path, "rb") as f:
+            data = tomllib.load(f)
+        defaults = data.get("account_defaults", {})
+        accounts = {}
+        for key, section in data.get("accounts", {}).items():
+            try:
+                options = self._account_options({**defaults, **section.get("options", {})})
+                accounts[key] = Account(
+                    section.get("name", key), section["firefox_profile"], options
+                )
+            except (KeyError, TypeError) as e:
+                raise exc.InvalidConfigException(f"Account '{key}': {e}") from e
+        servers = []
+        for section in data.get("servers", []):
+            try:
+                servers.append(
+                    Server(
+                        name=section["name"],
+                        server_id=section["server_id"],
+                        roll_channel_id=section["roll_channel_id"],
+                        minute_of_hour_to_roll=section["minute_of_hour_to_roll"],
+                        accounts=[accounts[key] for key in section["accounts"]],
+                        options=ServerOptions(**section.get("options", {})),
+                    )
+                )
+            except (KeyError, TypeError) as e:
+                name = section.get("name", "unnamed")
+                raise exc.InvalidConfigException(f"Server '{name}': {e}") from e
+        try:
+            runtime = RuntimeOptions(**data.get("runtime", {}))
+        except TypeError as e:
+            raise exc.InvalidConfigException(f"Runtime: {e}") from e
+        return Config(accounts, servers, self.files, runtime)
+
+    def _account_options(self, options: dict) -> AccountOptions:
+        options = dict(options)
+        wishlist_path = options.pop("wishlist", None)
+        series_path = options.pop("wishlist_series", None)
+        aliases = options.pop("wishlist_aliases", {})
+        threshold = options.pop("fuzzy_series_threshold", None)
+        wishlist = self._read_lines(wishlist_path)
+        wishlist_series = self._read_lines(series_path)
+        key = (wishlist_path, series_path, tuple(sorted(aliases.items())), threshold)
+        if key not in self._matchers:
+            self._matchers[key] = WishlistMatcher(
+                wishlist, wishlist_series, aliases, threshold
+            )
+        if "roll_order" in options:
+            options["roll_order"] = [_enum(Command, c) for c in options["roll_order"]]
+        if "allowed_kakera_reacts" in options:
+            options["allowed_kakera_reacts"] = [
+                _enum(ButtonAction, r) for r in options["allowed_kakera_reacts"]
+            ]
+        if "react_emoji" in options:
+            options["react_emoji"] = _enum(Emoji, options["react_emoji"])
+        return AccountOptions(
+            wishlist=wishlist,
+            wishlist_series=wishlist_series,
+            wishlist_matcher=self._matchers[key],
+            **options,
+        )
+
+    def _read_lines(self, path: str | None) -> list[str]:
+        if path is None:
+            return []
+        full_path = os.path.join(self.base_dir, path)
+        if full_path not in self._lines:
+            self.files.append(full_path)
+            with open(full_path, encoding="utf-8") as f:
+                self._lines[full_path] = f.read().splitlines()
+        return self._lines[full_path]
+
+
+def load_config(path: str) -> Config:
+    return _ConfigLoader(path).load()
+
+
+class ConfigStore:
+    """Holds the current Config and swaps in a new one when the config or wishlist files change.
+
+    A config that fails to load is logged and the previous one is kept.
+    """
+
+    path: str
+    current: Config
+    _mtimes: dict[str, float | None]
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.current = load_config(path)
+        self._mtimes = self._read_mtimes(self.current.files)
+        self._lock = Lock()
+
+    def reload_if_changed(self) -> bool:
+        """Reloads if any file changed since the last load. True if a new config was swapped in."""
+        with self._lock:
+            mtimes = self._read_mtimes(self.current.files)
+            if mtimes == self._mtimes:
+                return False
+            self._mtimes = mtimes
+            try:
+                config = load_config(self.path)
+            except (OSError, tomllib.TOMLDecodeError, exc.InvalidConfigException):
+                logging.error(f"Unable to reload {self.path}", exc_info=True)
+                return False
+            self._mtimes = self._read_mtimes(config.files)
+            self.current = config
+        logging.info(
+            f"Reloaded {self.path}: {len(config.accounts)} accounts, {len(config.servers)} servers"
+        )
+        return True
+
+    def _read_mtimes(self, files: list[str]) -> dict[str, float | None]:
+        mtimes = {}
+        for path in files:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+
+__all__ = ["Config", "ConfigStore", "RuntimeOptions", "load_config"]
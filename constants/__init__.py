@@ -1,8 +1,7 @@
 from .button_action import ButtonAction, ALL_KAKERA_REACTS
 from .command import Command
 from .message_source import MessageSource
-from .tu_row import TuRow
 from .wait import Wait
 from .emoji import Emoji
 
-__all__ = [ALL_KAKERA_REACTS, ButtonAction, Command, Emoji, MessageSource, TuRow, Wait]
+__all__ = [ALL_KAKERA_REACTS, ButtonAction, Command, Emoji, MessageSource, Wait]
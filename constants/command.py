@@ -9,7 +9,6 @@ class Command(StrEnum):
     NOTE = "/note"
     TIMERS_UP = "/tu"
     TIMERS_UP_ARRANGE = "/rollsutil tuarrange"
-    TIMERS_UP_ARRANGE_PARAM = "claim, rolls, rt, rollsreset, jump, kakerareact, kakerapower, kakerainfo, kakerastock, jump, dk, daily, vote, pokemon"
     POKESLOT = "/pokeslot"
     RESET_CLAIM_TIMER = "/rollsutil resetclaimtimer"
     DAILY = "/daily"
@@ -5,8 +5,17 @@ class Wait:
     DEFAULT_TIME_OUT = 3.5
     MESSAGE_LOAD = 0.5
     COMMAND_LOAD = 0.5
+    COMMAND_RESPONSE = 6.0
+    COMMAND_RECOGNIZED = 1.0
     PAGE_LOAD = 5.0
+    NAVIGATE = 10.0
+    ROLL_PIPELINE_SPACING = 0.3
     SPAM_REACT = 0.1
-    LOAD_BUTTON = 0.2
+    BUTTONS_APPEAR = 2.0
+    KAKERA_BUTTONS_APPEAR = 0.2
     LET_CLAIM_COOK = 4.0
     COAST_IS_CLEAR = 15.0
+    COAST_IS_CLEAR_CHECK = 20.0
+    WATCH_CHECK = 20.0
+    # how long after a roll Mudae lets it be claimed or reacted to
+    CLAIM_WINDOW = 45.0
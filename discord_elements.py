@@ -1,13 +1,20 @@
+from collections import OrderedDict, deque
+from copy import copy
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import date, datetime, timedelta, timezone
 import logging
 from operator import attrgetter
 import re
-from retry import retry
+from threading import Lock
 from selenium import webdriver
 from selenium.common.exceptions import (
+    JavascriptException,
     NoSuchElementException,
-    StaleElementReferenceException,
+    TimeoutException,
     ElementClickInterceptedException,
+    WebDriverException,
 )
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
@@ -15,7 +22,8 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.remote.webelement import WebElement
-from time import sleep
+from selenium.webdriver.support.ui import WebDriverWait
+from time import perf_counter, sleep, time
 
 from constants import (
     ALL_KAKERA_REACTS,
@@ -23,15 +31,61 @@ from constants import (
     Command,
     Emoji,
     MessageSource,
-    TuRow,
     Wait,
 )
 import exceptions as exc
+from metrics import METRICS, SEND_HISTOGRAM, counted_retry, record_span, span, tags
+import page_scripts
+from profiling import PROFILER
+from queue import Empty
+from rate_limit import RATE_LIMITER
+from roll_bus import CLAIM_LOCKS, RollBus, Subscription
+from sessions import BrowserSession, SessionManager, Tab, profile_lock
+from wishlist import WishlistMatcher
 
-DISPLAY_NAMES_TO_CLAIM_WISHES_FOR: set[str] = set([])
 
+class DisplayNameRegistry:
+    """Thread-safe set of display names whose wishes any of our accounts may claim."""
+
+    _names: set[str]
+    _lock: Lock
+
+    def __init__(self) -> None:
+        self._names = set()
+        self._lock = Lock()
+
+    def add(self, display_name: str) -> None:
+        with self._lock:
+            self._names.add(display_name)
+
+    def discard(self, display_name: str) -> None:
+        with self._lock:
+            self._names.discard(display_name)
+
+    def isdisjoint(self, display_names: Iterable[str]) -> bool:
+        with self._lock:
+            return self._names.isdisjoint(display_names)
+
+    def snapshot(self) -> frozenset[str]:
+        with self._lock:
+            return frozenset(self._names)
+
+    def __contains__(self, display_name: str) -> bool:
+        with self._lock:
+            return display_name in self._names
+
+
+DISPLAY_NAMES_TO_CLAIM_WISHES_FOR = DisplayNameRegistry()
+
+DISCORD_URL = "https://discord.com"
 DEFAULT_EMOJI = Emoji.GAME_DIE
 UNCLAIMED_MESSAGE = "Belongs to "
+# more rolls than this in flight at once risks Mudae or Discord rate limits
+MAX_ROLL_PIPELINE_DEPTH = 3
+# text commands that roll, like $wa for /wa, and the short forms of $wx, $hx and $mx
+ROLL_TEXT_COMMANDS = frozenset(
+    [f"${c.value[1:]}" for c in Command if c.name.startswith("ROLL")] + ["$w", "$h", "$m"]
+)
 
 
 class DiscordElement: ...
@@ -44,22 +98,33 @@ class AccountOptions:
     allowed_kakera_reacts: White list kakera reacts to prevent clicking low value ones
     wishlist: names of characters that should be claimed if rolled
     wishlist_series: names of series from which characters should be claimed if rolled
+    wishlist_aliases: alternate spellings of wished names or series, mapped to the wished spelling
+    fuzzy_series_threshold: also claim from series that are this similar (0 to 1) to a wished one
+    wishlist_matcher: an already built matcher to share between accounts, used instead of the above
     greed_threshold_kakera: if the character is more valuable than this, claim it
     greed_threshold_rank: if the character is better ranked than this, claim it
     react_emoji: Emoji to be used for claims
     announcement_message: A message or command to be sent before you start rolling.
     headless: if true, run with without any UI
+    use_claim_agent: click wish and kakera buttons from inside the page as soon as rolls render.
+        Only exact name, series and alias matches are claimed this way; the rest is left to Python.
+    roll_pipeline_depth: rolls sent before waiting for a response, up to MAX_ROLL_PIPELINE_DEPTH
+    fast_command_input: enter slash commands in one step instead of typing them, when Discord allows
     """
 
     roll_order: list[Command]
     allowed_kakera_reacts: list[ButtonAction]
     wishlist: list[str]
     wishlist_series: list[str]
+    wishlist_matcher: WishlistMatcher
     greed_threshold_kakera: int
     greed_threshold_rank: int
     react_emoji: Emoji
     announcement_message: str
     headless: bool
+    use_claim_agent: bool
+    roll_pipeline_depth: int
+    fast_command_input: bool
 
     def __init__(
         self,
@@ -67,21 +132,39 @@ class AccountOptions:
         allowed_kakera_reacts: list[ButtonAction] = [ALL_KAKERA_REACTS],
         wishlist: list[str] = [],
         wishlist_series: list[str] = [],
+        wishlist_aliases: dict[str, str] = {},
+        fuzzy_series_threshold: float | None = None,
         greed_threshold_kakera=9999,
         greed_threshold_rank=0,
         react_emoji=DEFAULT_EMOJI,
         announcement_message=f"It's roll time! {Emoji.GAME_DIE}",
         headless=True,
+        use_claim_agent=False,
+        roll_pipeline_depth=1,
+        wishlist_matcher: WishlistMatcher | None = None,
+        fast_command_input=False,
     ) -> None:
         self.roll_order = roll_order
         self.allowed_kakera_reacts = allowed_kakera_reacts
         self.wishlist = wishlist
         self.wishlist_series = wishlist_series
+        if wishlist_matcher is None:
+            wishlist_matcher = WishlistMatcher(
+                wishlist, wishlist_series, wishlist_aliases, fuzzy_series_threshold
+            )
+        self.wishlist_matcher = wishlist_matcher
         self.greed_threshold_kakera = greed_threshold_kakera
         self.greed_threshold_rank = greed_threshold_rank
         self.react_emoji = react_emoji
         self.announcement_message = announcement_message
         self.headless = headless
+        self.use_claim_agent = use_claim_agent
+        if roll_pipeline_depth > MAX_ROLL_PIPELINE_DEPTH:
+            logging.warning(
+                f"roll_pipeline_depth {roll_pipeline_depth} is capped at {MAX_ROLL_PIPELINE_DEPTH}"
+            )
+        self.roll_pipeline_depth = max(1, min(roll_pipeline_depth, MAX_ROLL_PIPELINE_DEPTH))
+        self.fast_command_input = fast_command_input
 
 
 class Account:
@@ -114,15 +197,23 @@ class Account:
         ffOptions.add_argument(self.firefox_profile)
         browser = webdriver.Firefox(options=ffOptions)
         browser.implicitly_wait(Wait.DEFAULT_TIME_OUT)
-        return browser
+        return PROFILER.wrap(browser)
 
 
 class MessageBox:
+    """The box messages and commands are typed into.
+
+    fast_input: enter slash commands with one in-page edit instead of typing them. Falls back
+    to typing, for good, the first time Discord doesn't recognize a command entered this way.
+    """
+
     _driver: WebDriver
     element: WebElement
+    fast_input: bool
 
-    def __init__(self, driver: WebDriver) -> None:
+    def __init__(self, driver: WebDriver, fast_input: bool = False) -> None:
         self._driver = driver
+        self.fast_input = fast_input
         try:
             self.element = driver.find_element(By.XPATH, "//div[@role='textbox']")
         except NoSuchElementException as e:
@@ -131,6 +222,9 @@ class MessageBox:
             ) from e
 
     def send(self, text: str, param: str | None = None) -> None:
+        if self.fast_input and text.startswith("/") and self._insert_command(text, param):
+            self.element.send_keys(Keys.RETURN)
+            return
         self._clear_text()
         self.element.send_keys(Keys.ESCAPE)
         if text.startswith("/"):
@@ -145,6 +239,26 @@ class MessageBox:
         action.send_keys(Keys.BACKSPACE)
         action.perform()
 
+    def _insert_command(self, command: str, param: str | None) -> bool:
+        if not command.endswith(" "):
+            command += " "
+        try:
+            recognized = self._driver.execute_async_script(
+                page_scripts.FAST_COMMAND_INPUT_JS,
+                self.element,
+                command,
+                param,
+                int(Wait.COMMAND_RECOGNIZED * 1000),
+            )
+        except (JavascriptException, TimeoutException):
+            recognized = False
+        if not recognized:
+            logging.warning(
+                f"{command.strip()} was not recognized from fast input, typing instead"
+            )
+            self.fast_input = False
+        return bool(recognized)
+
     def _send_command(self, command: str, param: str | None):
         command = command.lstrip("/")
         if not command.endswith(" "):
@@ -157,13 +271,13 @@ class MessageBox:
             self.element.send_keys(param)
         self.element.send_keys(Keys.RETURN)
 
-    @retry(NoSuchElementException, 3)
+    @counted_retry(NoSuchElementException, 3)
     def _wait_for_slash_to_be_recognized(self):
         self._driver.find_element(
             By.XPATH, "//div[starts-with(@class, 'autocomplete_')]"
         )
 
-    @retry(NoSuchElementException, 3)
+    @counted_retry(NoSuchElementException, 3)
     def _wait_for_command_to_be_recognized(self):
         self._driver.find_element(
             By.XPATH, "//div[starts-with(@class, 'attachedBars_')]"
@@ -197,42 +311,65 @@ def parse_date_str(input_text: str):
 
 
 class Message:
+    """A chat message, built from a snapshot taken in the page by page_scripts.
+
+    The WebElement is only looked up when something needs to interact with it.
+    """
+
     _driver: WebDriver
     _channel: "Channel"
+    _element: WebElement | None
+    html_id: str
     message_id: int
-    element: WebElement
     source: MessageSource
     invoked_by_user: str
     command: Command | None
     content: str
     sent_at: datetime
+    button_names: list[str]
+    shows_kakera: bool
+    prompt: str | None
 
     @property
     def id(self):
-        return f"chat-messages-{self._channel._channel_id}-{id}"
+        return self.html_id
+
+    @property
+    def element(self) -> WebElement:
+        if self._element is None:
+            self._element = self._driver.find_element(By.ID, self.html_id)
+        return self._element
 
     def __init__(
-        self, driver: WebDriver, channel: "Channel", element: WebElement
+        self,
+        driver: WebDriver,
+        channel: "Channel",
+        snapshot: dict,
+        element: WebElement | None = None,
     ) -> None:
         self._driver = driver
         self._channel = channel
-        self.element = element
-        self.message_id = element.get_attribute("id").split("-")[-1]
-        text_lines = element.text.split("\n")
+        self._element = element
+        self.html_id = snapshot["html_id"]
+        self.message_id = self.html_id.split("-")[-1]
+        self.button_names = snapshot["buttons"]
+        self.shows_kakera = snapshot.get("kakera_icon", False)
+        self.prompt = snapshot.get("prompt")
+        text_lines = snapshot["lines"]
         self.command, self.invoked_by_user = None, None
-        self.sent_at = self._get_time_stamp()
+        self.sent_at = self._parse_time_stamp(snapshot["datetime"])
 
         if len(text_lines) == 1:
             self.source = MessageSource.TEXT
-        elif text_lines[1] == " used ":
+        elif text_lines[1].strip() == "used":
             self.invoked_by_user = text_lines[0].lstrip("@")
             self.source = MessageSource.SLASH_COMMAND
             try:
-                self.command = Command(text_lines[2])
+                self.command = Command(text_lines[2].strip())
             except Exception:
                 self.command = Command.UNKNOWN
             text_lines = text_lines[6:]
-        elif text_lines[1] == "BOT":
+        elif text_lines[1].strip() == "BOT":
             self.source = MessageSource.TEXT_COMMAND
             text_lines = text_lines[3:]
         else:
@@ -240,10 +377,62 @@ class Message:
             text_lines = text_lines[2:]
         self.content = "\n".join(text_lines)
 
+    @classmethod
+    def from_element(
+        cls, driver: WebDriver, channel: "Channel", element: WebElement
+    ) -> "Message":
+        snapshot = driver.execute_script(page_scripts.EXTRACT_ELEMENT_JS, element)
+        return cls(driver, channel, snapshot, element)
+
+    def wait_for_button_names(
+        self,
+        required: str | list[str] | None = None,
+        timeout: float = Wait.BUTTONS_APPEAR,
+    ) -> list[str]:
+        """Waits until the message has buttons, or the required one, or any of a list of them,
+        since they can render a moment after the embed. Returns the names found, which may
+        still lack it on timeout."""
+        if isinstance(required, str):
+            required = [required]
+
+        def buttons_rendered(driver: WebDriver) -> bool:
+            snapshot = driver.execute_script(
+                page_scripts.EXTRACT_MESSAGE_BY_ID_JS, self.html_id, None
+            )
+            if snapshot is not None:
+                self.button_names = snapshot["buttons"]
+            if required is None:
+                return bool(self.button_names)
+            return any(name in self.button_names for name in required)
+
+        try:
+            WebDriverWait(self._driver, timeout, poll_frequency=Wait.SPAM_REACT).until(
+                buttons_rendered
+            )
+        except TimeoutException:
+            logging.debug(f"Buttons did not appear on {self.html_id}")
+        return self.button_names
+
+    @property
+    def is_roll(self) -> bool:
+        """A roll response, either to a roll slash command or to a Mudae text command such as
+        $wa. A text command response counts when it follows a roll text command and shows the
+        embed's kakera value, so character info like $im doesn't."""
+        if self.command is not None:
+            return self.command.name.startswith("ROLL")
+        if self.source != MessageSource.TEXT_COMMAND or not self.prompt:
+            return False
+        if self.prompt.split()[0].lower() not in ROLL_TEXT_COMMANDS:
+            return False
+        return self.shows_kakera or any(
+            line.strip().isnumeric() for line in self.content.split("\n")
+        )
+
     def get_fresh(self) -> "Message":
         return self._channel.get_message_by_id(self.message_id)
 
     def react(self, emoji: Emoji):
+        self._channel.throttle("react")
         js_code = "arguments[0].scrollIntoView();"
         self._driver.execute_script(js_code, self.element)
 
@@ -268,24 +457,42 @@ class Message:
         )
         emoji_button.click()
 
-    def _get_time_stamp(self) -> datetime:
-        time_element = self.element.find_element(By.TAG_NAME, "time")
-        time_str = time_element.get_attribute("datetime")
+    def _parse_time_stamp(self, time_str: str | None) -> datetime:
+        if not time_str:
+            return datetime.now(timezone.utc)
         time_stamp = datetime.fromisoformat(time_str)
         return time_stamp.replace(tzinfo=timezone.utc)
 
 
 class MudaeButton:
-    _element: WebElement
+    """A button under a message. The WebElement is only looked up by name when clicked,
+    so buttons added or reordered since the snapshot don't matter."""
+
+    _message: Message
+    _element: WebElement | None
     action: ButtonAction
 
-    def __init__(self, element: WebElement) -> None:
-        self._element = element
-        self.action = ButtonAction(element.accessible_name)
+    def __init__(self, message: Message, accessible_name: str) -> None:
+        self._message = message
+        self._element = None
+        self.action = ButtonAction(accessible_name)
+
+    @property
+    def element(self) -> WebElement:
+        if self._element is None:
+            self._element = self._message._driver.execute_script(
+                page_scripts.FIND_BUTTON_JS, self._message.html_id, self.action.value
+            )
+            if self._element is None:
+                raise NoSuchElementException(
+                    f"No {self.action.name} button on {self._message.html_id}"
+                )
+        return self._element
 
-    @retry(ElementClickInterceptedException, 5, Wait.SPAM_REACT)
+    @counted_retry(ElementClickInterceptedException, 5, Wait.SPAM_REACT)
     def click(self) -> None:
-        self._element.click()
+        self._message._channel.throttle("click")
+        self.element.click()
 
 
 class CharacterRoll:
@@ -293,13 +500,14 @@ class CharacterRoll:
     _message: Message
     name: str
     series: str
+    series_lines: list[str]
     rank: int
     kakera: int
     claimed: bool
     owner: str
     wished: bool
     wished_by: list[str]
-    kakera_reacts: list[MudaeButton]  # the buttons
+    _buttons: list[MudaeButton] | None
 
     @property
     def claimed(self):
@@ -317,13 +525,13 @@ class CharacterRoll:
     def rolled_by(self):
         return self._message.invoked_by_user
 
+    @property
+    def sent_at(self) -> datetime:
+        return self._message.sent_at
+
     def __init__(self, browser: WebDriver, message: Message):
-        if (
-            message is None
-            or message.command is None
-            or not message.command.name.startswith("ROLL")
-        ):
-            raise TypeError("Supplied message is not roll slash command response")
+        if message is None or not message.is_roll:
+            raise TypeError("Supplied message is not a roll")
 
         self._browser = browser
         self._message = message
@@ -369,11 +577,13 @@ class CharacterRoll:
                 lines.pop()
             if lines[-1] == UNCLAIMED_MESSAGE:
                 lines.pop()
-            self.series = " ".join(line for line in lines if line)
+            self.series_lines = [line for line in lines if line]
+            self.series = " ".join(self.series_lines)
         else:
+            self.series_lines = []
             self.series = "Meme"
 
-        self._set_buttons()
+        self._buttons = None
 
     @property
     def footer(self):
@@ -383,53 +593,511 @@ class CharacterRoll:
         return f"#{self.rank} {self.footer}"
 
     def _set_wished_by(self, text: str) -> None:
-        if text.endswith("(edited)"):
-            text = text[0:-10]
-        return [name.strip() for name in text.split(",")]
-
-    def _set_buttons(self) -> None:
-        buttons = [MudaeButton(b) for b in self._get_button_elements()]
-        if self.wished:
-            self.wish_react = next(b for b in buttons if b.action == ButtonAction.WISH)
-        self.kakera_reacts = [b for b in buttons if b.action != ButtonAction.WISH]
-        pass
+        text = re.sub(r"\s*\(edited\)$", "", text)[len("Wished by ") :]
+        return [name.strip().removeprefix("@") for name in text.split(",")]
+
+    @property
+    def buttons(self) -> list[MudaeButton]:
+        """Built from the names in the message snapshot. No WebDriver calls until one is clicked."""
+        if self._buttons is None:
+            self._buttons = [
+                MudaeButton(self._message, name) for name in self._message.button_names
+            ]
+        return self._buttons
+
+    @property
+    def wish_react(self) -> MudaeButton | None:
+        if self.wished and ButtonAction.WISH not in self._message.button_names:
+            if ButtonAction.WISH not in self._message.wait_for_button_names(
+                ButtonAction.WISH
+            ):
+                logging.warning(f"Wish button did not appear on {self.id}")
+            self._buttons = None
+        return next((b for b in self.buttons if b.action == ButtonAction.WISH), None)
+
+    @property
+    def kakera_reacts(self) -> list[MudaeButton]:
+        """Buttons late to render are waited for in the page with the response, or come as an
+        edit while watching, so this makes no WebDriver calls."""
+        return [b for b in self.buttons if b.action != ButtonAction.WISH]
 
     def claim(self, emoji=DEFAULT_EMOJI) -> None:
         logging.info(f"Attempting claim for: {self}")
         self.react(emoji)
         pass
 
-    def _get_button_elements(self) -> list[WebElement]:
-        sleep(Wait.LOAD_BUTTON)
-        return self._message.element.find_elements(
-            By.XPATH, ".//button[@role='button']"
-        )
-
     def react(self, emoji: Emoji = DEFAULT_EMOJI):
         self._message.react(emoji)
 
+    def refresh_owner(self, message: Message) -> None:
+        """Takes the owner from a fresh read of this roll's message, without re-parsing the rest."""
+        self._message = message
+        self._buttons = None
+        self.owner = next(
+            (
+                line[len("Belongs to ") :]
+                for line in message.content.split("\n")
+                if line.startswith("Belongs to ")
+            ),
+            None,
+        )
+
     def get_fresh(self) -> "CharacterRoll":
         return CharacterRoll(self._browser, self._message.get_fresh())
 
+    def seen_from(self, channel: "Channel") -> "CharacterRoll | None":
+        """This roll as another account's browser shows it, so that account can click on it.
+        Only the owner and buttons are read again. None if the message isn't there."""
+        if channel is self._message._channel:
+            return self
+        message = channel.get_message_by_html_id(self.id)
+        if message is None:
+            return None
+        roll = copy(self)
+        roll._browser = channel._driver
+        roll.refresh_owner(message)
+        return roll
+
+
+class MessageCache:
+    """Parsed messages keyed by html id, with the least recently used evicted past max_size.
+
+    Each entry keeps the fingerprint of the DOM it was parsed from, so the page only sends back
+    full snapshots for messages that are new or were edited since.
+    """
+
+    max_size: int
+    hits: int
+    misses: int
+    invalidations: int
+    evictions: int
+    _entries: OrderedDict[str, tuple[str, Message]]
+
+    def __init__(self, max_size: int = 200) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def fingerprints(self) -> dict[str, str]:
+        return {html_id: entry[0] for html_id, entry in self._entries.items()}
+
+    def get(self, html_id: str) -> Message | None:
+        entry = self._entries.get(html_id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(html_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, message: Message, fingerprint: str) -> None:
+        if message.html_id in self._entries:
+            self.invalidations += 1
+        else:
+            self.misses += 1
+        self._entries[message.html_id] = (fingerprint, message)
+        self._entries.move_to_end(message.html_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> str:
+        return (
+            f"{self.hits} hits, {self.misses} parsed, {self.invalidations} edited, "
+            f"{self.evictions} evicted, {len(self)} cached"
+        )
+
 
 class Channel:
+    """A text channel or thread.
+
+    account: the account acting in this channel, whose rate limit clicks and reacts count against
+    tab: the browser tab showing this channel, switched to before the channel is used
+    watch_responses: wait for slash command responses with an in-page observer instead of polling.
+    Falls back to polling if the observer can't be installed or misses a response.
+    """
+
     _driver: WebDriver
     _server_id: int
     _channel_id: int
     _message_box: MessageBox
+    _watch_responses: bool
+    _agent_clicks: dict[str, set[str]]
+    _stream_cursor: int | None
+    message_cache: MessageCache
+    claim_agent_enabled: bool
+    _claim_agent_account: str
+    account: Account | None
+    tab: Tab | None
 
-    def __init__(self, driver: WebDriver, server_id: int, channel_id: int) -> None:
+    def __init__(
+        self,
+        driver: WebDriver,
+        server_id: int,
+        channel_id: int,
+        watch_responses: bool = True,
+        account: Account | None = None,
+        tab: Tab | None = None,
+    ) -> None:
         self._driver = driver
+        self.account = account
+        self.tab = tab
+        self.activate()
         self._server_id = server_id
         self._channel_id = channel_id
-        self._message_box = MessageBox(driver)
+        self._message_box = MessageBox(
+            driver, fast_input=account is not None and account.options.fast_command_input
+        )
+        self.message_cache = MessageCache()
+        self._agent_clicks = {}
+        self._stream_cursor = None
+        self.claim_agent_enabled = False
+        self._claim_agent_account = ""
+        self._watch_responses = watch_responses and self._install_observer()
+
+    def activate(self) -> None:
+        if self.tab is not None:
+            self.tab.activate()
+
+    def _install_observer(self) -> bool:
+        try:
+            return bool(
+                self._driver.execute_script(
+                    page_scripts.INSTALL_MESSAGE_OBSERVER_JS, str(self._channel_id)
+                )
+            )
+        except JavascriptException:
+            logging.warning("Unable to watch channel, polling for responses instead")
+            return False
 
-    @retry(exc.SlashCommandResponseNotFoundException, 2)
+    def start_claim_agent(self, user: Account, can_claim: bool) -> bool:
+        """Has the page click qualifying wish and kakera buttons on user's rolls by itself."""
+        matcher = user.options.wishlist_matcher
+        self._claim_agent_account = user.name
+        config = {
+            "invoker": user.display_name,
+            "rollCommands": [c.value for c in Command if c.name.startswith("ROLL")],
+            "wishers": sorted(DISPLAY_NAMES_TO_CLAIM_WISHES_FOR.snapshot()),
+            "names": sorted(matcher.names),
+            "series": sorted(matcher.series),
+            "aliases": matcher.aliases,
+            "kakera": [
+                r.value
+                for r in user.options.allowed_kakera_reacts
+                if isinstance(r, ButtonAction)
+            ],
+            "wishAction": ButtonAction.WISH.value,
+            "canClaim": can_claim,
+        }
+        try:
+            self.claim_agent_enabled = bool(
+                self._driver.execute_script(
+                    page_scripts.INSTALL_CLAIM_AGENT_JS, str(self._channel_id), config
+                )
+            )
+        except JavascriptException:
+            logging.warning(f"Unable to start claim agent for {user.name}")
+            self.claim_agent_enabled = False
+        return self.claim_agent_enabled
+
+    def stop_claim_agent(self) -> None:
+        """Collects the agent's last clicks and removes it from the page."""
+        if not self.claim_agent_enabled:
+            return
+        self.get_agent_clicks("")
+        self._driver.execute_script(
+            page_scripts.UNINSTALL_CLAIM_AGENT_JS, str(self._channel_id)
+        )
+        self.claim_agent_enabled = False
+
+    def set_claim_agent_can_claim(self, can_claim: bool) -> None:
+        if self.claim_agent_enabled:
+            self._driver.execute_script(
+                page_scripts.INSTALL_CLAIM_AGENT_JS,
+                str(self._channel_id),
+                {"canClaim": can_claim},
+            )
+
+    def note_click(self, html_id: str, action: str) -> None:
+        """Remembers a click made from Python, so it isn't repeated if the message is handled again."""
+        self._agent_clicks.setdefault(html_id, set()).add(action)
+
+    def get_agent_clicks(self, html_id: str) -> set[str]:
+        """Button actions clicked on a message so far, by the claim agent or with note_click.
+
+        The agent clicks before Python hears of it, so its clicks are charged to the rate
+        limiter and its claims taken in CLAIM_LOCKS here, after the fact."""
+        if self.claim_agent_enabled:
+            for click in self._driver.execute_script(
+                page_scripts.DRAIN_AGENT_CLICKS_JS, str(self._channel_id)
+            ):
+                logging.info(f"Claim agent clicked {click['action']} on {click['html_id']}")
+                RATE_LIMITER.charge(self._claim_agent_account, str(self._channel_id), click["kind"])
+                if click["action"] == ButtonAction.WISH.value:
+                    CLAIM_LOCKS.take(click["html_id"], self._claim_agent_account)
+                self._agent_clicks.setdefault(click["html_id"], set()).add(
+                    click["action"]
+                )
+        return self._agent_clicks.get(html_id, set())
+
+    @counted_retry(exc.SlashCommandResponseNotFoundException, 2)
     def send(self, user: Account, text: str, params: str | None = None) -> Message:
         """Sends inputs to the message box and returns the response."""
+        input_command = self._characterize_input(text)[0]
+        self.activate()
+        self.throttle("send", user)
+        with span("send", SEND_HISTOGRAM, command=input_command or "text"):
+            return self._send(user, text, params)
+
+    def _send(self, user: Account, text: str, params: str | None) -> Message:
         input_command, input_source = self._characterize_input(text)
         min_msg_id = self.get_latest_message().message_id
         self._message_box.send(text, params)
+        latest_message = None
+        if input_source == MessageSource.SLASH_COMMAND and self._watch_responses:
+            latest_message = self._wait_for_response(input_command, user, min_msg_id)
+        if latest_message is None:
+            latest_message = self._poll_for_response(
+                input_command, input_source, user, min_msg_id
+            )
+        # Handle other messages that may have appeared while waiting
+        now = datetime.now(timezone.utc)
+        stale_message_age_limit = timedelta(seconds=30)
+        if input_command is not None and (
+            input_command != latest_message.command
+            or (user.display_name != latest_message.invoked_by_user)
+            or (now - latest_message.sent_at) > stale_message_age_limit
+        ):
+            latest_message = next(
+                message
+                for message in self.get_messages()
+                if message.command == input_command
+            )
+        if "Command DISABLED for this channel" in latest_message.content:
+            raise exc.CommandDisabledException()
+
+        return latest_message
+
+    def dismiss_popups(self) -> None:
+        """Presses escape in the message box. Nothing is posted, so no response is waited for."""
+        self.activate()
+        self._message_box.send(Keys.ESCAPE * 2)
+
+    def throttle(self, action: str, user: Account | None = None) -> None:
+        """Waits until the rate limiter lets user, or this channel's account, act here."""
+        user = user or self.account
+        RATE_LIMITER.acquire(user.name if user else "", str(self._channel_id), action)
+
+    def send_rolls(self, user: Account, commands: list[Command], depth: int = 1):
+        """Sends roll commands and yields their responses in the order they were sent.
+
+        depth: how many rolls may wait for a response at once. Each response is matched to its
+        command by invoker, command and message order, so ones that arrive out of order are fine.
+        If a response doesn't show up in time, the rest are polled for and sent one at a time,
+        and the rolls stop if it never does, so no response is taken for a later command's.
+        """
+        depth = min(depth, MAX_ROLL_PIPELINE_DEPTH)
+        self.activate()
+        if depth <= 1 or not self._watch_responses:
+            for command in commands:
+                yield self.send(user, command)
+            return
+        min_msg_id = self.get_latest_message().message_id
+        to_send = list(commands)
+        in_flight: deque[tuple[Command, float, float]] = deque()
+        taken: list[str] = []
+        polling = False
+        while to_send or in_flight:
+            while to_send and len(in_flight) < depth:
+                if in_flight:
+                    sleep(Wait.ROLL_PIPELINE_SPACING)
+                command = to_send.pop(0)
+                self.throttle("send", user)
+                in_flight.append((command, time(), perf_counter()))
+                self._message_box.send(command)
+            command, started_at, started = in_flight.popleft()
+            response = None
+            if not polling:
+                response = self._wait_for_response(command, user, min_msg_id, taken)
+            if response is None:
+                if not polling:
+                    logging.warning(
+                        f"No response to pipelined {command} for {user.name}, polling for the rest"
+                    )
+                    polling = True
+                    depth = 1
+                try:
+                    response = self._poll_for_pipelined_response(
+                        command, user, min_msg_id, taken
+                    )
+                except exc.SlashCommandResponseNotFoundException as e:
+                    record_span(
+                        "send",
+                        SEND_HISTOGRAM,
+                        started_at,
+                        perf_counter() - started,
+                        type(e).__name__,
+                        command=command,
+                    )
+                    raise
+            record_span(
+                "send", SEND_HISTOGRAM, started_at, perf_counter() - started, command=command
+            )
+            taken.append(response.html_id)
+            if "Command DISABLED for this channel" in response.content:
+                raise exc.CommandDisabledException()
+            yield response
+
+    def _poll_for_pipelined_response(
+        self, command: Command, user: Account, min_msg_id: str, skip_ids: list[str]
+    ) -> Message:
+        """Reads the channel until the oldest response to command not in skip_ids shows up,
+        matching it the way the page does for _wait_for_response."""
+        for _ in range(10):
+            for message in reversed(self.get_messages()):
+                if (
+                    int(message.message_id) > int(min_msg_id)
+                    and message.html_id not in skip_ids
+                    and message.command == command
+                    and message.invoked_by_user == user.display_name
+                    and message.content.strip() != ""
+                    and not message.content.startswith("Sending command...")
+                ):
+                    return message
+            sleep(Wait.MESSAGE_LOAD)
+        raise exc.SlashCommandResponseNotFoundException(
+            f"Problem sending {command} for {user.name}"
+        )
+
+    def _wait_for_response(
+        self,
+        command: Command,
+        user: Account,
+        min_msg_id: str,
+        skip_ids: list[str] = [],
+    ) -> Message | None:
+        """Blocks in the page until the response to command shows up. None if it didn't.
+        skip_ids: responses already matched to an earlier command."""
+        try:
+            result = self._driver.execute_async_script(
+                page_scripts.WAIT_FOR_RESPONSE_JS,
+                str(self._channel_id),
+                str(min_msg_id),
+                command.value,
+                user.display_name,
+                int(Wait.COMMAND_RESPONSE * 1000),
+                skip_ids,
+                int(Wait.KAKERA_BUTTONS_APPEAR * 1000)
+                if command.name.startswith("ROLL")
+                else 0,
+            )
+        except (JavascriptException, TimeoutException):
+            logging.warning(f"Problem watching for {command}, polling instead")
+            return None
+        if result["status"] == "missing":
+            self._watch_responses = self._install_observer()
+            return None
+        if result["status"] != "found":
+            return None
+        return self._message_from_snapshot(result["snapshot"], result["element"])
+
+    def wait_for_quiet(
+        self,
+        quiet_seconds: float,
+        ignore_invokers: Iterable[str] = (),
+        mudae_only: bool = True,
+    ) -> bool:
+        """Blocks until nothing that counts as activity has happened here for quiet_seconds.
+        Returns False without waiting if the channel isn't being watched.
+
+        ignore_invokers: display names whose commands, and Mudae's responses to them, don't count
+        mudae_only: only Mudae's messages count, not chatter
+        """
+        if not self._watch_responses:
+            return False
+        since = None
+        while True:
+            self.activate()
+            try:
+                result = self._driver.execute_async_script(
+                    page_scripts.WAIT_FOR_QUIET_JS,
+                    str(self._channel_id),
+                    int(quiet_seconds * 1000),
+                    sorted(ignore_invokers),
+                    mudae_only,
+                    since,
+                    int(Wait.COAST_IS_CLEAR_CHECK * 1000),
+                )
+            except (JavascriptException, TimeoutException):
+                logging.warning("Problem watching for a quiet channel, polling instead")
+                return False
+            if result["status"] == "missing":
+                self._watch_responses = self._install_observer()
+                return False
+            if result["status"] == "quiet":
+                return True
+            since = result["last_activity"]
+            logging.info("Waiting for others to be done.")
+
+    def stream(
+        self, until: datetime | None = None
+    ) -> Iterator["Message | CharacterRoll"]:
+        """Yields messages as they are added or edited, until until or forever. Finished roll
+        responses come as CharacterRoll. Waits in the page between messages, so an idle channel
+        costs one call to the page every Wait.WATCH_CHECK, plus a tab switch if another channel
+        was shown in between. Picks up where the previous stream on this channel left off.
+        Ends early if the channel can't be watched."""
+        while until is None or datetime.now() < until:
+            timeout = Wait.WATCH_CHECK
+            if until is not None:
+                timeout = min(timeout, (until - datetime.now()).total_seconds())
+            self.activate()
+            try:
+                result = self._driver.execute_async_script(
+                    page_scripts.STREAM_MESSAGES_JS,
+                    str(self._channel_id),
+                    self._stream_cursor,
+                    self.message_cache.fingerprints(),
+                    max(0, int(timeout * 1000)),
+                )
+            except (JavascriptException, TimeoutException):
+                logging.warning("Problem watching for new messages")
+                return
+            if result["status"] == "missing":
+                self._stream_cursor = None
+                if not self._install_observer():
+                    logging.warning("Unable to watch channel for new messages")
+                    return
+                continue
+            self._stream_cursor = result["version"]
+            for snapshot in result.get("snapshots", []):
+                if snapshot.get("unchanged"):
+                    continue
+                yield self._roll_or_message(self._message_from_snapshot(snapshot))
+
+    def _roll_or_message(self, message: Message) -> "Message | CharacterRoll":
+        if not message.is_roll or message.content.strip() in [
+            "",
+            "Sending command...",
+        ]:
+            return message
+        try:
+            return CharacterRoll(self._driver, message)
+        except IndexError:
+            return message
+
+    def _poll_for_response(
+        self,
+        input_command: Command | None,
+        input_source: MessageSource,
+        user: Account,
+        min_msg_id: str,
+    ) -> Message:
         if input_command is not None:
             sleep(Wait.COMMAND_LOAD)
         else:
@@ -440,7 +1108,7 @@ class Channel:
             input_source == MessageSource.SLASH_COMMAND
             and latest_message.source == MessageSource.SLASH_COMMAND
             and latest_message.content in ["", "Sending command..."]
-        ) or latest_message.id <= min_msg_id:
+        ) or int(latest_message.message_id) <= int(min_msg_id):
             sleep(Wait.MESSAGE_LOAD)
             latest_message = self.get_latest_message()
             attempts += 1
@@ -448,40 +1116,20 @@ class Channel:
                 raise exc.SlashCommandResponseNotFoundException(
                     f"Problem sending {input_command} for {user.name}"
                 )
-        # Handle other messages that may have appeared while waiting
-        now = datetime.now(timezone.utc)
-        stale_message_age_limit = timedelta(seconds=30)
-        if input_command is not None and (
-            input_command != latest_message.command
-            or (user.display_name != latest_message.invoked_by_user)
-            or (now - latest_message.sent_at) > stale_message_age_limit
-        ):
-            latest_message = next(
-                message
-                for message in self.get_messages()
-                if message.command == input_command
-            )
-        if "Command DISABLED for this channel" in latest_message.content:
-            raise exc.CommandDisabledException()
-
         return latest_message
 
-    @retry(StaleElementReferenceException, tries=4)
     def get_messages(self, limit=25) -> list[Message]:
         """returns the latest messages in the channel
         limit: number of results to allow. Use None to allow all."""
-        message_elements = self._driver.find_elements(
-            By.XPATH, "//li[starts-with(@id, 'chat-messages')]"
-        )[::-1]
-        if limit >= len(message_elements):
-            limit = None
-        slice_latest = slice(None, limit, None)
-        return [
-            Message(self._driver, self, message_element)
-            for message_element in message_elements[slice_latest]
-        ]
-
-    @retry(StaleElementReferenceException, tries=2, delay=Wait.MESSAGE_LOAD)
+        self.activate()
+        snapshots = self._driver.execute_script(
+            page_scripts.EXTRACT_MESSAGES_JS,
+            str(self._channel_id),
+            limit,
+            self.message_cache.fingerprints(),
+        )
+        return [self._message_from_snapshot(snapshot) for snapshot in snapshots]
+
     def get_latest_message(self) -> Message:
         return self.get_messages(1)[0]
 
@@ -492,17 +1140,43 @@ class Channel:
         return f"chat-messages-{self._channel_id}-{message_id}"
 
     def get_message_by_html_id(self, id: str):
-        try:
-            return Message(
-                self._driver,
-                self,
-                self._driver.find_element(By.XPATH, f"//li[@id='{id}']"),
-            )
-        except NoSuchElementException:
+        self.activate()
+        snapshot = self._driver.execute_script(
+            page_scripts.EXTRACT_MESSAGE_BY_ID_JS,
+            id,
+            self.message_cache.fingerprints(),
+        )
+        if snapshot is None:
             return None
+        return self._message_from_snapshot(snapshot)
+
+    def get_messages_by_html_id(self, ids: list[str]) -> dict[str, Message]:
+        """Reads every message in ids with one query. Missing messages are left out."""
+        self.activate()
+        snapshots = self._driver.execute_script(
+            page_scripts.EXTRACT_MESSAGES_BY_ID_JS,
+            ids,
+            self.message_cache.fingerprints(),
+        )
+        messages = [self._message_from_snapshot(s) for s in snapshots if s is not None]
+        return {message.html_id: message for message in messages}
+
+    def _message_from_snapshot(
+        self, snapshot: dict, element: WebElement | None = None
+    ) -> Message:
+        if snapshot.get("unchanged"):
+            cached = self.message_cache.get(snapshot["html_id"])
+            if cached is not None:
+                return cached
+            snapshot = self._driver.execute_script(
+                page_scripts.EXTRACT_MESSAGE_BY_ID_JS, snapshot["html_id"], None
+            )
+        message = Message(self._driver, self, snapshot, element)
+        self.message_cache.put(message, snapshot["fingerprint"])
+        return message
 
     def parse_message(self, web_element: WebElement):
-        return Message(self._driver, self, self, web_element)
+        return Message.from_element(self._driver, self, web_element)
 
     def _characterize_input(self, text):
         try:
@@ -518,9 +1192,58 @@ class Channel:
         return input_command, input_source
 
 
+TIMERS_UP_CLEANSE = re.compile(r"[^a-z0-9 \n]")
+# Each line of $tu, lowercased and stripped of punctuation, is matched against this table.
+# Named groups starting with can_ are set to whether they matched, the rest are ints.
+# A group ending in _hours is added to the _minutes group of the same name.
+TIMERS_UP_PATTERNS = [
+    (
+        "claim",
+        re.compile(
+            r"you (?:(?P<can_claim>can) claim right now|cant claim)\D*?"
+            r"(?:(?P<claim_reset_hours>\d+)h )?(?P<claim_reset_minutes>\d+) min"
+        ),
+    ),
+    (
+        "rolls",
+        re.compile(
+            r"you have (?P<rolls_left>\d+) rolls? (?:(?P<mk_rolls_left>\d+) mk )?left"
+            r"(?:.*?reset in (?:(?P<rolls_reset_hours>\d+)h )?(?P<rolls_reset_minutes>\d+) min)?"
+        ),
+    ),
+    ("rt", re.compile(r"^(?P<can_rt>rt is available)|cooldown of rt ")),
+    ("rolls_reset", re.compile(r"you have (?P<rolls_reset_stock>\d+) rolls? reset in stock")),
+    ("kakera_power", re.compile(r"^power (?P<kakera_power>\d+)")),
+    ("kakera_cost", re.compile(r"kakera reaction consumes (?P<kakera_cost>\d+)")),
+    ("kakera_stock", re.compile(r"^stock (?P<kakera_stock>\d+)")),
+    (
+        "dk",
+        re.compile(
+            r"^(?P<can_daily_kakera>dk is ready)|^next dk in "
+            r"(?:(?P<daily_kakera_reset_hours>\d+)h )?(?P<daily_kakera_reset_minutes>\d+) min"
+        ),
+    ),
+    (
+        "daily",
+        re.compile(
+            r"^(?P<can_daily>daily is available)|^next daily reset in "
+            r"(?:(?P<daily_reset_hours>\d+)h )?(?P<daily_reset_minutes>\d+) min"
+        ),
+    ),
+    (
+        "pokeslot",
+        re.compile(
+            r"^(?P<can_pokeslot>p is available)|before your next p "
+            r"(?:(?P<pokeslot_reset_hours>\d+)h )?(?P<pokeslot_reset_minutes>\d+) min"
+        ),
+    ),
+]
+
+
 class TimersUp:
-    """Requires this tu arrange command be used on each account:
-    $ta claim, rolls, rt, rollsreset, jump, kakerareact, kakerapower, kakerainfo, kakerastock, jump, dk, daily, vote, pokemon
+    """Parses the response to /tu. Lines are recognized by their content, so any $tuarrange works.
+    Values on lines that are not shown keep their defaults: False, 0, or None for the minutes
+    until the claim, rolls, daily, dk and pokeslot are next available.
 
     Example:
         {name}, you can claim right now! The next claim reset is in 2h 21 min.
@@ -540,22 +1263,28 @@ class TimersUp:
         Remaining time before your next $p: 59 min.
     """
 
-    can_claim: bool
-    can_rt: bool
-    can_daily_kakera: bool
-    can_daily: bool
-    can_pokeslot: bool
-    claim_reset_minutes: int
-    rolls_left: int
-    mk_rolls_left: int
-    rolls_reset: int
-    kakera_stock: int
-    kakera_power: int
-    kakera_cost: int
+    can_claim: bool = False
+    can_rt: bool = False
+    can_daily_kakera: bool = False
+    can_daily: bool = False
+    can_pokeslot: bool = False
+    claim_reset_minutes: int | None = None
+    rolls_left: int = 0
+    mk_rolls_left: int = 0
+    rolls_reset_stock: int = 0
+    kakera_stock: int = 0
+    kakera_power: int = 0
+    kakera_cost: int = 0
+    rolls_reset_minutes: int | None = None
+    daily_reset_minutes: int | None = None
+    daily_kakera_reset_minutes: int | None = None
+    pokeslot_reset_minutes: int | None = None
+    recognized: set[str]
 
     @property
     def is_claim_hour(self):
-        return self.claim_reset_minutes <= 60
+        # without a claim line, claim whenever possible as if it were
+        return self.claim_reset_minutes is None or self.claim_reset_minutes <= 60
 
     @property
     def can_react(self):
@@ -566,36 +1295,173 @@ class TimersUp:
             raise exc.InvalidTimersUpMessageException(
                 f"Expecting {Command.TIMERS_UP} but received {tu_message.command}"
             )
-        lines = self._cleanse_response(tu_message.content)
-
-        self.can_claim = "you can claim right now" in lines[TuRow.CLAIM]
-        self.can_rt = lines[TuRow.RESET_CLAIM_TIMER] == "rt is available"
-        self.can_daily_kakera = lines[TuRow.DAILY_KAKERA] == "dk is ready"
-        self.can_daily = lines[TuRow.DAILY] == "daily is available"
-        self.can_pokeslot = lines[TuRow.POKESLOT] == "p is available"
-        self.claim_reset_minutes = self._extract_minutes(lines[TuRow.CLAIM][-9:])
-        self.rolls_left = self._extract_int(lines[TuRow.ROLLS][9:11])
-        self.mk_rolls_left = self._extract_int(lines[TuRow.ROLLS][17:25])
-        self.rolls_reset_stock = self._extract_int(lines[TuRow.ROLLS_RESET])
-        self.kakera_stock = self._extract_int(lines[TuRow.KAKERA_STOCK])
-        self.kakera_power = self._extract_int(lines[TuRow.KAKERA_POWER])
-        self.kakera_cost = self._extract_int(lines[TuRow.KAKERA_COST])
+        self._parse(tu_message.content)
+
+    @classmethod
+    def from_content(cls, content: str) -> "TimersUp":
+        tu = cls.__new__(cls)
+        tu._parse(content)
+        return tu
+
+    def _parse(self, content: str) -> None:
+        self.recognized = set()
+        for line in TIMERS_UP_CLEANSE.sub("", content.lower()).splitlines():
+            line = line.strip()
+            for key, pattern in TIMERS_UP_PATTERNS:
+                if key in self.recognized:
+                    continue
+                match = pattern.search(line)
+                if match:
+                    self.recognized.add(key)
+                    self._set_values(match.groupdict())
+                    break
+        if not self.recognized:
+            raise exc.InvalidTimersUpMessageException(f"Nothing recognized in $tu: {content}")
+
+    def _set_values(self, values: dict[str, str | None]) -> None:
+        hours = {k: v for k, v in values.items() if k.endswith("_hours")}
+        for field, value in values.items():
+            if field.startswith("can_"):
+                setattr(self, field, value is not None)
+            elif value is not None and field not in hours:
+                setattr(self, field, int(value))
+        for field, value in hours.items():
+            if value is not None:
+                minutes_field = field.removesuffix("_hours") + "_minutes"
+                setattr(self, minutes_field, getattr(self, minutes_field) + int(value) * 60)
+
+
+class AccountState:
+    """Predicts what /tu would show, starting from a TimersUp and updated as the account acts,
+    so the account does not need another /tu before claiming at the end of the hour.
+
+    confidence in the claim and roll timers starts at 1 and drops on every claim, since its
+    outcome is not read back and it may have been sniped. Below CONFIDENCE_TO_TRUST,
+    needs_refresh is True. Kakera reacts don't touch those timers and leave it alone.
+    """
 
-        pass
+    CONFIDENCE_TO_TRUST = 0.75
+    UNCONFIRMED_CLAIM_CONFIDENCE = 0.5
+
+    can_claim: bool
+    can_rt: bool
+    can_daily_kakera: bool
+    can_daily: bool
+    can_pokeslot: bool
+    rolls_left: int
+    mk_rolls_left: int
+    kakera_power: int
+    kakera_cost: int
+    confidence: float
+    _claim_reset_minutes: int | None
+    _reset_minutes: dict[str, int | None]
+    _seeded_at: float
+
+    def __init__(self, tu: TimersUp) -> None:
+        self.can_claim = tu.can_claim
+        self.can_rt = tu.can_rt
+        self.can_daily_kakera = tu.can_daily_kakera
+        self.can_daily = tu.can_daily
+        self.can_pokeslot = tu.can_pokeslot
+        self.rolls_left = tu.rolls_left
+        self.mk_rolls_left = tu.mk_rolls_left
+        self.kakera_power = tu.kakera_power
+        self.kakera_cost = tu.kakera_cost
+        self.confidence = 1.0
+        self._claim_reset_minutes = tu.claim_reset_minutes
+        self._reset_minutes = {
+            "rolls": tu.rolls_reset_minutes,
+            "daily": tu.daily_reset_minutes,
+            "daily_kakera": tu.daily_kakera_reset_minutes,
+            "pokeslot": tu.pokeslot_reset_minutes,
+        }
+        self._seeded_at = perf_counter()
+
+    @property
+    def claim_reset_minutes(self) -> float | None:
+        """None if /tu didn't show when the claim resets."""
+        if self._claim_reset_minutes is None:
+            return None
+        return self._claim_reset_minutes - (perf_counter() - self._seeded_at) / 60
+
+    @property
+    def is_claim_hour(self) -> bool:
+        minutes = self.claim_reset_minutes
+        return minutes is None or minutes <= 60
 
-    def _cleanse_response(self, tu_command_response: str) -> list[str]:
-        cleaned = re.sub(r"[^a-z0-9 \n]", "", tu_command_response.lower())
-        return [line.strip() for line in cleaned.splitlines()]
+    @property
+    def can_react(self) -> bool:
+        return self.kakera_power >= self.kakera_cost
 
-    def _extract_int(self, input) -> int:
-        return int("0" + re.sub("[^0-9]", "", input).strip())
+    @property
+    def needs_refresh(self) -> bool:
+        # once the claim resets, the next reset time is unknown
+        minutes = self.claim_reset_minutes
+        return self.confidence < self.CONFIDENCE_TO_TRUST or (
+            minutes is not None and minutes <= 0
+        )
 
-    def _extract_minutes(self, displayed_time) -> int:
-        times = [int(t) for t in re.sub(r"[^0-9 ]", "", displayed_time).split(" ") if t]
-        if len(times) == 1:
-            return times[0]
+    def rolled(self, command: Command) -> None:
+        if command == Command.ROLL_KAKERA:
+            self.mk_rolls_left = max(0, self.mk_rolls_left - 1)
         else:
-            return times[0] * 60 + times[1]
+            self.rolls_left = max(0, self.rolls_left - 1)
+
+    def claimed(self) -> None:
+        self.can_claim = False
+        self.confidence = min(self.confidence, self.UNCONFIRMED_CLAIM_CONFIDENCE)
+
+    def reset_claim_timer(self) -> None:
+        self.can_rt = False
+        self.can_claim = True
+
+    def reacted_to_kakera(self) -> None:
+        # characters with 10+ keys cost half, so this may undercount until the next /tu
+        self.kakera_power = max(0, self.kakera_power - self.kakera_cost)
+
+    def did_daily(self) -> None:
+        self.can_daily = False
+
+    def did_daily_kakera(self) -> None:
+        self.can_daily_kakera = False
+
+    def did_pokeslot(self) -> None:
+        self.can_pokeslot = False
+
+    def available_at(self, now: datetime) -> dict[str, datetime | None]:
+        """When rolls, daily, dk and pokeslot are next available, as of now.
+        None where it is not known, such as a daily done since /tu was read."""
+        seen_at = now - timedelta(seconds=perf_counter() - self._seeded_at)
+        available = {
+            "rolls": self.rolls_left + self.mk_rolls_left > 0,
+            "daily": self.can_daily,
+            "daily_kakera": self.can_daily_kakera,
+            "pokeslot": self.can_pokeslot,
+        }
+        times = {}
+        for timer, is_available in available.items():
+            minutes = self._reset_minutes[timer]
+            if is_available:
+                times[timer] = now
+            elif minutes is None:
+                times[timer] = None
+            else:
+                times[timer] = seen_at + timedelta(minutes=minutes)
+        return times
+
+    def snapshot(self) -> dict:
+        return {
+            "can_claim": self.can_claim,
+            "can_rt": self.can_rt,
+            "claim_reset_minutes": (
+                round(self.claim_reset_minutes, 1)
+                if self.claim_reset_minutes is not None
+                else None
+            ),
+            "rolls_left": self.rolls_left,
+            "kakera_power": self.kakera_power,
+            "confidence": round(self.confidence, 2),
+        }
 
 
 def get_best_waifu(rolls: list[CharacterRoll]) -> CharacterRoll:
@@ -614,11 +1480,21 @@ def get_user_display_name(browser: WebDriver) -> str:
 
 
 class ServerOptions:
+    """Set options for rolling on a server.
+
+    max_workers: number of accounts to process at the same time. Each one runs its own browser.
+    quiet_ignores_own: when waiting for the channel to go quiet, don't wait on our own accounts
+    quiet_ignores_chatter: when waiting for the channel to go quiet, only wait on Mudae's messages
+    """
+
     do_react: bool
     do_daily: bool
     do_daily_kakera: bool
     do_pokeslot: bool
     announce_start: bool
+    max_workers: int
+    quiet_ignores_own: bool
+    quiet_ignores_chatter: bool
 
     def __init__(
         self,
@@ -627,16 +1503,50 @@ class ServerOptions:
         do_daily_kakera: bool = True,
         do_pokeslot: bool = True,
         announce_start: bool = False,
+        max_workers: int = 1,
+        quiet_ignores_own: bool = True,
+        quiet_ignores_chatter: bool = True,
     ) -> None:
         self.do_react = do_react
         self.do_daily = do_daily
         self.do_daily_kakera = do_daily_kakera
         self.do_pokeslot = do_pokeslot
         self.announce_start = announce_start
+        self.max_workers = max(1, max_workers)
+        self.quiet_ignores_own = quiet_ignores_own
+        self.quiet_ignores_chatter = quiet_ignores_chatter
+
+
+class AccountWatch:
+    """What an account watching a server keeps between checks: the channel open in its
+    browser, its display name there and its predicted timers."""
+
+    session: BrowserSession
+    channel: Channel
+    display_name: str
+    state: AccountState | None
+
+    def __init__(
+        self,
+        session: BrowserSession,
+        channel: Channel,
+        display_name: str,
+        state: AccountState | None = None,
+    ) -> None:
+        self.session = session
+        self.channel = channel
+        self.display_name = display_name
+        self.state = state
 
 
 class Server:
-    """Contains config for rolling on a server."""
+    """Contains config for rolling on a server.
+
+    base_url: where the Discord web app is served from. Only changed to point at a stand-in.
+    last_timers: each account's state at the end of its last run here, by account name
+    prewarmed: channels opened ahead of the next run by prewarm, with the account's session
+        and display name, by account name
+    """
 
     name: str
     server_id: int
@@ -644,10 +1554,13 @@ class Server:
     minute_of_hour_to_roll: int
     accounts: list[Account]
     options: ServerOptions
+    base_url: str
+    last_timers: dict[str, AccountState]
+    prewarmed: dict[str, tuple[BrowserSession, Channel, str]]
 
     @property
     def url(self):
-        return f"https://discord.com/channels/{self.server_id}/{self.roll_channel_id}"
+        return f"{self.base_url}/channels/{self.server_id}/{self.roll_channel_id}"
 
     def __init__(
         self,
@@ -657,6 +1570,7 @@ class Server:
         minute_of_hour_to_roll: int,
         accounts: list[Account],
         options: ServerOptions = ServerOptions(),
+        base_url: str = DISCORD_URL,
     ):
         self.name = name
         self.server_id = server_id
@@ -664,21 +1578,313 @@ class Server:
         self.minute_of_hour_to_roll = minute_of_hour_to_roll
         self.accounts = accounts
         self.options = options
+        self.base_url = base_url
+        self.last_timers = {}
+        self.prewarmed = {}
+
+    def prewarm(self, sessions: SessionManager, hold_seconds: float = 0) -> list[str]:
+        """Opens the channel and reads the display name of every account ahead of a run, so the
+        run can start rolling right away. Accounts that are free are done first. The rest are
+        waited for until every watch has had time to finish its check, and skipped if still busy.
+        Returns the names of the accounts that are ready.
+
+        hold_seconds: keep watches on other servers off the accounts this long, or until the
+            run takes them, so the run doesn't wait on a watch either
+        """
+        started = perf_counter()
+        ready = []
+        busy = []
+        for user in self.accounts:
+            sessions.hold_for_run(user, hold_seconds)
+        for user in self.accounts:
+            lock = profile_lock(user.firefox_profile)
+            if lock.acquire(blocking=False):
+                self._prewarm_account(sessions, user, lock, ready)
+            else:
+                busy.append(user)
+        deadline = perf_counter() + Wait.WATCH_CHECK + Wait.PAGE_LOAD
+        for user in busy:
+            lock = profile_lock(user.firefox_profile)
+            if lock.acquire(timeout=max(0, deadline - perf_counter())):
+                self._prewarm_account(sessions, user, lock, ready)
+            else:
+                logging.info(f"Not prewarming {user.name} for {self.name}, it is busy")
+        logging.info(
+            f"Prewarmed {self.name} in {perf_counter() - started:.1f}s, "
+            f"{len(ready)} of {len(self.accounts)} accounts ready: {ready}"
+        )
+        return ready
+
+    def _prewarm_account(
+        self, sessions: SessionManager, user: Account, lock: Lock, ready: list[str]
+    ) -> None:
+        """Prewarms user, whose profile lock is held, and releases the lock."""
+        try:
+            with tags(server=self.name, account=user.name), span("prewarm"):
+                session = sessions.acquire(user)
+                tab = session.open(self.url)
+                channel = Channel(
+                    session.driver,
+                    self.server_id,
+                    self.roll_channel_id,
+                    account=user,
+                    tab=tab,
+                )
+                display_name = self._read_display_name(channel, user)
+            self.prewarmed[user.name] = (session, channel, display_name)
+            ready.append(user.name)
+        except Exception:
+            logging.warning(f"Problem prewarming {user.name}", exc_info=True)
+        finally:
+            lock.release()
+
+    def watch(self, sessions: SessionManager, until: datetime | None = None) -> None:
+        """Claims and reacts to other people's rolls in the roll channel, with the same rules as
+        an account's own rolls, until until or forever. Each account watches in its own warm
+        browser and lets go of it between checks, so scheduled runs can still use it.
+
+        Only one account reads the channel. It publishes the rolls it sees on a RollBus, which
+        offers each claim to a single account that wants it and can claim."""
+        if not self.accounts:
+            return
+        logging.info(f"Watching {self.name} {self.url}")
+        watch_account = partial(
+            self._watch_for_account, sessions=sessions, until=until, bus=RollBus()
+        )
+        with ThreadPoolExecutor(
+            max_workers=len(self.accounts), thread_name_prefix=f"watch-{self.server_id}"
+        ) as pool:
+            list(pool.map(watch_account, self.accounts))
+        logging.info(f"Stopped watching {self.name}")
+
+    def _watch_for_account(
+        self,
+        user: Account,
+        sessions: SessionManager,
+        until: datetime | None,
+        bus: RollBus,
+    ) -> None:
+        lock = profile_lock(user.firefox_profile)
+        subscription = bus.subscribe(user.name, partial(self._wants_to_claim, user))
+        watch = None
+        try:
+            while until is None or datetime.now() < until:
+                if sessions.held_for_run(user):
+                    # a run elsewhere is about to use this browser
+                    sleep(Wait.MESSAGE_LOAD)
+                    continue
+                check_until = datetime.now() + timedelta(seconds=Wait.WATCH_CHECK)
+                if until is not None:
+                    check_until = min(check_until, until)
+                with lock, tags(server=self.name, account=user.name):
+                    try:
+                        watch = self._watch_once(
+                            user, sessions, watch, check_until, bus, subscription
+                        )
+                    except Exception:
+                        logging.error(
+                            f"Problem watching {self.name} for {user.name}", exc_info=True
+                        )
+                        sessions.discard(user)
+                        watch = None
+                if datetime.now() < check_until:
+                    # the channel couldn't be watched, so try again later
+                    sleep((check_until - datetime.now()).total_seconds())
+                else:
+                    # give a run waiting on this account a chance to take it
+                    sleep(Wait.SPAM_REACT)
+        finally:
+            bus.unsubscribe(user.name)
+
+    def _watch_once(
+        self,
+        user: Account,
+        sessions: SessionManager,
+        watch: AccountWatch | None,
+        until: datetime,
+        bus: RollBus,
+        subscription: Subscription,
+    ) -> AccountWatch:
+        # the browser is only checked and the channel only opened again after a failed check,
+        # or when a run elsewhere moved it off this channel
+        if watch is None:
+            session = sessions.acquire(user)
+            tab = session.open(self.url)
+            channel = Channel(
+                session.driver, self.server_id, self.roll_channel_id, account=user, tab=tab
+            )
+            watch = AccountWatch(
+                session,
+                channel,
+                self._read_display_name(channel, user),
+                self.last_timers.get(user.name),
+            )
+        elif not watch.session.tab_per_server and watch.session.url != self.url:
+            watch.channel.tab = watch.session.open(self.url)
+        user.display_name = watch.display_name
+        DISPLAY_NAMES_TO_CLAIM_WISHES_FOR.add(watch.display_name)
+        if watch.state is None or watch.state.needs_refresh:
+            watch.state = AccountState(self.get_timers_up(watch.channel, user))
+        subscription.state = watch.state
+        if not bus.lead(user.name):
+            self._handle_published(watch, user, subscription, until)
+            return watch
+        claim_window = timedelta(seconds=Wait.CLAIM_WINDOW)
+        for item in watch.channel.stream(until):
+            # every edit is handled, until the roll can no longer be claimed or reacted to
+            if (
+                not isinstance(item, CharacterRoll)
+                or datetime.now(timezone.utc) - item.sent_at > claim_window
+            ):
+                continue
+            # our own rolls are handled by the account that rolled them
+            if item.rolled_by in DISPLAY_NAMES_TO_CLAIM_WISHES_FOR:
+                continue
+            # wait for kakera buttons in this browser, before other accounts read the roll
+            item.kakera_reacts
+            claimer = bus.publish(item)
+            logging.info(
+                f"{user.name} saw {item.rolled_by} roll {item}, "
+                f"claim offered to {claimer.name if claimer else 'nobody'}"
+            )
+            self._handle_published(watch, user, subscription)
+            bus.lead(user.name)
+        return watch
 
-    def do_rolls(self):
+    def _handle_published(
+        self,
+        watch: AccountWatch,
+        user: Account,
+        subscription: Subscription,
+        until: datetime | None = None,
+    ) -> None:
+        """Handles the rolls published for user so far, or until until if given. Only reads
+        a roll again in user's browser when user may claim it or has kakera to react to."""
+        while True:
+            try:
+                if until is None:
+                    roll, may_claim = subscription.rolls.get_nowait()
+                else:
+                    timeout = (until - datetime.now()).total_seconds()
+                    if timeout <= 0:
+                        return
+                    roll, may_claim = subscription.rolls.get(timeout=timeout)
+            except Empty:
+                return
+            clicked = watch.channel.get_agent_clicks(roll.id)
+            reacts = [
+                b
+                for b in roll.kakera_reacts
+                if b.action in user.options.allowed_kakera_reacts
+                and b.action not in clicked
+            ]
+            if not may_claim and not reacts:
+                continue
+            seen = roll.seen_from(watch.channel)
+            if seen is not None:
+                self._handle_roll(watch.channel, user, watch.state, seen, may_claim)
+
+    def do_rolls(self, sessions: SessionManager | None = None):
+        """Rolls for every account. Reuses warm browsers from sessions when provided."""
         logging.info(f"Rolling on server {self.name} {self.url}")
-        for user in self.accounts:
-            user.display_name = None
+        started = perf_counter()
+        self.last_timers = {}
+        roll_for_account = partial(self._roll_for_account, sessions=sessions)
+        workers = min(self.options.max_workers, len(self.accounts))
+        with tags(server=self.name), span("server"), PROFILER.run(self.name):
+            if workers > 1:
+                with ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix=f"rolls-{self.server_id}"
+                ) as pool:
+                    durations = list(pool.map(roll_for_account, self.accounts))
+            else:
+                durations = [roll_for_account(user) for user in self.accounts]
+        METRICS.write_prometheus()
+        if durations:
+            logging.info(
+                f"Finished {self.name} in {perf_counter() - started:.1f}s with {workers} worker(s). "
+                f"Slowest account: {max(durations):.1f}s, sum of accounts: {sum(durations):.1f}s"
+            )
+
+    def _roll_for_account(
+        self, user: Account, sessions: SessionManager | None = None
+    ) -> float:
+        """Runs one account in its own browser and returns the wall time it took."""
+        started = perf_counter()
+        lock = profile_lock(user.firefox_profile)
+        if not lock.acquire(blocking=False):
+            logging.info(f"{self.name} is waiting for {user.name} to be free")
+            lock.acquire()
+        try:
+            if sessions is not None:
+                sessions.release_for_run(user)
+            with tags(server=self.name, account=user.name), span("account"):
+                self._roll_with_lock(user, sessions)
+        finally:
+            lock.release()
+        elapsed = perf_counter() - started
+        logging.info(f"{user.name} finished on {self.name} in {elapsed:.1f}s")
+        return elapsed
+
+    def _roll_with_lock(self, user: Account, sessions: SessionManager | None) -> None:
+        user.display_name = None
+        if sessions is None:
+            self._roll_in_new_browser(user)
+        else:
             try:
-                browser = user.get_firefox_browser()
-                self._process_user(browser, user)
+                with span("page_load"):
+                    session = sessions.acquire(user)
+                    prewarmed = self._take_prewarmed(user, session)
+                    tab = session.open(self.url)
+                if prewarmed is not None:
+                    user.display_name = prewarmed[2]
+                    self._process_user(session.driver, user, tab, prewarmed[1])
+                else:
+                    self._process_user(session.driver, user, tab)
             except Exception:
                 logging.error(f"Problem processing user {user.name}", exc_info=True)
-            try:
-                logging.info(f"{user.name} finished")
+                # the page may be stuck behind a modal or logged out, so start afresh next time
+                sessions.discard(user)
+
+    def _take_prewarmed(
+        self, user: Account, session: BrowserSession
+    ) -> tuple[BrowserSession, Channel, str] | None:
+        """The prewarmed channel for user, if its browser and tab are still the ones it was opened in."""
+        prewarmed = self.prewarmed.pop(user.name, None)
+        if prewarmed is None:
+            return None
+        still_open = session.tab_per_server or session.url == self.url
+        if prewarmed[0] is not session or not still_open:
+            logging.info(f"Prewarmed channel for {user.name} on {self.name} went stale")
+            return None
+        return prewarmed
+
+    def _roll_in_new_browser(self, user: Account) -> None:
+        browser = None
+        try:
+            with span("page_load"):
+                browser = user.get_firefox_browser()
+                browser.get(self.url)
+                sleep(Wait.PAGE_LOAD)
+            self._process_user(browser, user)
+        except Exception:
+            logging.error(f"Problem processing user {user.name}", exc_info=True)
+        try:
+            if browser is not None:
                 browser.quit()
-            except Exception:
-                pass
+        except Exception:
+            pass
+
+    def _wait_for_coast_to_clear(self, channel: Channel) -> None:
+        ignored = ()
+        if self.options.quiet_ignores_own:
+            ignored = DISPLAY_NAMES_TO_CLAIM_WISHES_FOR.snapshot()
+        if channel.wait_for_quiet(
+            Wait.COAST_IS_CLEAR, ignored, self.options.quiet_ignores_chatter
+        ):
+            return
+        while not self._coast_is_clear(channel):
+            pass
 
     def _coast_is_clear(self, channel: Channel):
         latest = channel.get_latest_message()
@@ -692,53 +1898,111 @@ class Server:
             return False
         return True
 
-    def _process_user(self, browser: WebDriver, user: Account) -> None:
+    def _process_user(
+        self,
+        browser: WebDriver,
+        user: Account,
+        tab: Tab | None = None,
+        roll_channel: Channel | None = None,
+    ) -> None:
         logging.debug(f"Starting user {user.name}")
-        browser.get(self.url)
-        sleep(Wait.PAGE_LOAD)
-        roll_channel = Channel(browser, self.server_id, self.roll_channel_id)
-        roll_channel.send(user, Keys.ESCAPE * 2)
-        user.display_name = get_user_display_name(browser)
+        if roll_channel is None:
+            roll_channel = Channel(
+                browser, self.server_id, self.roll_channel_id, account=user, tab=tab
+            )
+        try:
+            self._process_user_in_channel(browser, roll_channel, user)
+        finally:
+            try:
+                roll_channel.stop_claim_agent()
+            except WebDriverException:
+                logging.warning(f"Unable to stop claim agent for {user.name}")
+            logging.info(
+                f"Message cache for {user.name}: {roll_channel.message_cache.stats()}"
+            )
+
+    def _read_display_name(self, channel: Channel, user: Account) -> str:
+        channel.dismiss_popups()
+        return get_user_display_name(channel._driver)
+
+    def _process_user_in_channel(
+        self, browser: WebDriver, roll_channel: Channel, user: Account
+    ) -> None:
+        if user.display_name is None:
+            with span("display_name"):
+                user.display_name = self._read_display_name(roll_channel, user)
         DISPLAY_NAMES_TO_CLAIM_WISHES_FOR.add(user.display_name)
-        while not self._coast_is_clear(roll_channel):
-            pass
+        with span("coast_is_clear"):
+            self._wait_for_coast_to_clear(roll_channel)
         if user.options.announcement_message and self.options.announce_start:
             try:
-                roll_channel.send(user, user.options.announcement_message)
+                with span("announce"):
+                    roll_channel.send(user, user.options.announcement_message)
             except exc.CommandDisabledException:
                 logging.warning(
                     f"{user.name} has an invalid announcement for {self.name}: {user.options.announcement_message}"
                 )
                 pass
         try:
-            tu = self.get_timers_up(roll_channel, user)
-        except exc.InvalidTimersUpException:
+            with span("timers_up"):
+                tu = self.get_timers_up(roll_channel, user)
+        except (exc.InvalidTimersUpException, exc.InvalidTimersUpMessageException):
             roll_channel.send(user, "Oops sorry!")
             logging.warn(f"Problem with $tu for {user.name}")
             return
-        self._do_non_rolls(user, roll_channel, tu)
-
-        self._do_rolls(
-            browser, roll_channel, user, tu, tu.mk_rolls_left, [Command.ROLL_KAKERA]
-        )
-        rolled = self._do_rolls(
-            browser, roll_channel, user, tu, tu.rolls_left, user.options.roll_order
-        )
+        state = AccountState(tu)
+        self.last_timers[user.name] = state
+        if user.options.use_claim_agent:
+            roll_channel.start_claim_agent(user, state.can_claim)
+        with span("non_rolls"):
+            self._do_non_rolls(user, roll_channel, state)
+
+        with span("mk_rolls"):
+            self._do_rolls(
+                browser,
+                roll_channel,
+                user,
+                state,
+                state.mk_rolls_left,
+                [Command.ROLL_KAKERA],
+            )
+        with span("rolls"):
+            rolled = self._do_rolls(
+                browser,
+                roll_channel,
+                user,
+                state,
+                state.rolls_left,
+                user.options.roll_order,
+            )
 
-        if tu.rolls_left > 0:
-            tu = self.get_timers_up(roll_channel, user)
-        if rolled and tu.is_claim_hour and tu.can_claim:
-            self.claim_best_available(user, rolled, roll_channel)
+        if rolled and state.is_claim_hour and state.needs_refresh:
+            logging.info(f"Refreshing $tu for {user.name}, predicted {state.snapshot()}")
+            with span("refresh_timers_up"):
+                state = AccountState(self.get_timers_up(roll_channel, user))
+            self.last_timers[user.name] = state
+        if rolled and state.is_claim_hour and state.can_claim:
+            with span("claim_best_available"):
+                self.claim_best_available(user, rolled, roll_channel)
 
     def claim_best_available(
         self, user: Account, rolls: list[CharacterRoll], channel: Channel
     ):
-        best_choice = None
-        while best_choice is None or best_choice.claimed:
-            best_choice = get_best_waifu(rolls)
-            rolls.remove(best_choice)
-            best_choice = best_choice.get_fresh()
+        fresh_messages = channel.get_messages_by_html_id([r.id for r in rolls])
+        unclaimed = []
+        for roll in rolls:
+            if roll.id in fresh_messages:
+                roll.refresh_owner(fresh_messages[roll.id])
+                if not roll.claimed:
+                    unclaimed.append(roll)
+        if not unclaimed:
+            logging.info(f"Nothing left to claim for {user.name}")
+            return
+        best_choice = get_best_waifu(unclaimed)
         if best_choice is not None:
+            if not CLAIM_LOCKS.take(best_choice.id, user.name):
+                logging.info(f"Already went for {best_choice.name}")
+                return
             best_choice.claim()
             sleep(Wait.LET_CLAIM_COOK)
             if best_choice.wished and DISPLAY_NAMES_TO_CLAIM_WISHES_FOR.isdisjoint(
@@ -749,93 +2013,131 @@ class Server:
                     user, Command.NOTE, f"{best_choice.name} $ wish: {wishers}"
                 )
 
-    @retry(exc.InvalidTimersUpException, 2)
-    def get_timers_up(self, channel: Channel, user: Account, is_retry_after_ta=False):
-        try:
-            response = channel.send(user, "/tu")
-            # prevent someone else's tu from being read
-            name_on_tu = response.content.split(",")[0]
-            if user.name != name_on_tu:
-                raise exc.InvalidTimersUpException(user.name, name_on_tu)
-            return TimersUp(response)
-        except IndexError as e:
-            if not is_retry_after_ta:
-                channel.send(
-                    user, Command.TIMERS_UP_ARRANGE, Command.TIMERS_UP_ARRANGE_PARAM
-                )
-                return self.get_timers_up(channel, user, True)
-            else:
-                channel.send(user, "Oops")
-                raise e
-
-    def _do_non_rolls(self, user: Account, channel: Channel, tu: TimersUp) -> None:
-        if self.options.do_daily and tu.can_daily:
+    @counted_retry(exc.InvalidTimersUpException, 2)
+    def get_timers_up(self, channel: Channel, user: Account) -> TimersUp:
+        response = channel.send(user, Command.TIMERS_UP)
+        # prevent someone else's tu from being read
+        name_on_tu = response.content.split(",")[0]
+        if user.name != name_on_tu:
+            raise exc.InvalidTimersUpException(user.name, name_on_tu)
+        return TimersUp(response)
+
+    def _do_non_rolls(self, user: Account, channel: Channel, state: AccountState) -> None:
+        if self.options.do_daily and state.can_daily:
             channel.send(user, Command.DAILY)
+            state.did_daily()
         if (
             self.options.do_daily_kakera
-            and tu.can_daily_kakera
-            and not tu.can_react  # todo: smarter dk
+            and state.can_daily_kakera
+            and not state.can_react  # todo: smarter dk
         ):
             channel.send(user, Command.DAILY_KAKERA)
-        if self.options.do_pokeslot and tu.can_pokeslot:
+            state.did_daily_kakera()
+        if self.options.do_pokeslot and state.can_pokeslot:
             channel.send(user, Command.POKESLOT)
+            state.did_pokeslot()
 
     def _do_rolls(
         self,
         browser: WebDriver,
         channel: Channel,
         user: Account,
-        tu: TimersUp,
+        state: AccountState,
         count: int,
         roll_order: list[Command],
     ) -> list[CharacterRoll]:
+        commands = [roll_order[i % len(roll_order)] for i in range(count)]
         rolled = []
-        for i in range(count):
-            command = roll_order[i % len(roll_order)]
-            just_rolled = CharacterRoll(browser, channel.send(user, command))
+        depth = user.options.roll_pipeline_depth
+        for response in channel.send_rolls(user, commands, depth):
+            just_rolled = CharacterRoll(browser, response)
+            state.rolled(response.command)
             rolled.append(just_rolled)
-            if (
-                just_rolled.wished
-                and not just_rolled.claimed
-                and (tu.can_claim or tu.can_rt)
-                and not DISPLAY_NAMES_TO_CLAIM_WISHES_FOR.isdisjoint(
-                    set(just_rolled.wished_by)
-                )
-            ):
-                logging.info(
-                    f"Claiming wish with {user.name}: '{just_rolled.name}'. Wished by: '{just_rolled.wished_by}'"
-                )
-                if not tu.can_claim:
-                    channel.send(user, Command.RESET_CLAIM_TIMER)
-                    tu.can_rt = False
-                just_rolled = just_rolled.get_fresh()
-                just_rolled.wish_react.click()
-                just_rolled.owner = user.display_name
-                tu.can_claim = False
-                continue
-            if just_rolled.kakera_reacts:
-                good_reacts = [
-                    b
-                    for b in just_rolled.kakera_reacts
-                    if b.action in user.options.allowed_kakera_reacts
-                ]
-                for react_button in good_reacts:
-                    react_button.click()
-            if (
-                (tu.can_claim or tu.can_rt)
-                and not just_rolled.claimed
-                and (
-                    just_rolled.name in user.options.wishlist
-                    or just_rolled.series in user.options.wishlist_series
-                    or just_rolled.rank <= user.options.greed_threshold_rank
-                    or just_rolled.kakera >= user.options.greed_threshold_kakera
-                )
-            ):
-                if not tu.can_claim:
-                    channel.send(user, Command.RESET_CLAIM_TIMER)
-                    tu.can_rt = False
-                logging.info(f"Claiming for {user.name}: {just_rolled.name}")
+            self._handle_roll(channel, user, state, just_rolled)
+        return rolled
+
+    def _handle_roll(
+        self,
+        channel: Channel,
+        user: Account,
+        state: AccountState,
+        just_rolled: CharacterRoll,
+        may_claim: bool = True,
+    ) -> None:
+        """Claims or reacts to a roll as it arrives.
+        may_claim: False when another of our accounts was picked to claim it."""
+        agent_clicks = channel.get_agent_clicks(just_rolled.id)
+        if ButtonAction.WISH in agent_clicks:
+            logging.info(
+                f"Claim agent claimed for {user.name}: '{just_rolled.name}'. Wished by: '{just_rolled.wished_by}'"
+            )
+            just_rolled.owner = user.display_name
+            state.claimed()
+            return
+        if (
+            just_rolled.wished
+            and not just_rolled.claimed
+            and (state.can_claim or state.can_rt)
+            and not DISPLAY_NAMES_TO_CLAIM_WISHES_FOR.isdisjoint(
+                set(just_rolled.wished_by)
+            )
+            and may_claim
+            and CLAIM_LOCKS.take(just_rolled.id, user.name)
+        ):
+            logging.info(
+                f"Claiming wish with {user.name}: '{just_rolled.name}'. Wished by: '{just_rolled.wished_by}'"
+            )
+            if not state.can_claim:
+                channel.send(user, Command.RESET_CLAIM_TIMER)
+                state.reset_claim_timer()
+            wish_react = just_rolled.wish_react
+            if wish_react is not None:
+                wish_react.click()
+            else:
                 just_rolled.claim(user.options.react_emoji)
-                just_rolled.owner = user.display_name
+            just_rolled.owner = user.display_name
+            state.claimed()
+            channel.set_claim_agent_can_claim(False)
+            return
+        if just_rolled.kakera_reacts:
+            good_reacts = [
+                b
+                for b in just_rolled.kakera_reacts
+                if b.action in user.options.allowed_kakera_reacts
+                and b.action not in agent_clicks
+            ]
+            for react_button in good_reacts:
+                react_button.click()
+                channel.note_click(just_rolled.id, react_button.action)
+                state.reacted_to_kakera()
+        if (
+            (state.can_claim or state.can_rt)
+            and not just_rolled.claimed
+            and self._is_greedy_for(user, just_rolled)
+            and may_claim
+            and CLAIM_LOCKS.take(just_rolled.id, user.name)
+        ):
+            if not state.can_claim:
+                channel.send(user, Command.RESET_CLAIM_TIMER)
+                state.reset_claim_timer()
+            logging.info(f"Claiming for {user.name}: {just_rolled.name}")
+            just_rolled.claim(user.options.react_emoji)
+            just_rolled.owner = user.display_name
+            state.claimed()
+            channel.set_claim_agent_can_claim(False)
+
+    def _is_greedy_for(self, user: Account, roll: CharacterRoll) -> bool:
+        matcher = user.options.wishlist_matcher
+        return (
+            matcher.matches_name(roll.name)
+            or matcher.matches_series(roll.series, roll.series_lines)
+            or roll.rank <= user.options.greed_threshold_rank
+            or roll.kakera >= user.options.greed_threshold_kakera
+        )
 
-        return rolled
+    def _wants_to_claim(self, user: Account, roll: CharacterRoll) -> bool:
+        """Whether _handle_roll would claim roll for user, if user could claim."""
+        wished_for_us = roll.wished and not DISPLAY_NAMES_TO_CLAIM_WISHES_FOR.isdisjoint(
+            set(roll.wished_by)
+        )
+        return wished_for_us or self._is_greedy_for(user, roll)
@@ -18,3 +18,7 @@ class InvalidTimersUpException(Exception):
 
 class SlashCommandResponseNotFoundException(Exception):
     pass
+
+
+class InvalidConfigException(Exception):
+    pass
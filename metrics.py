@@ -0,0 +1,233 @@
+"""Timing spans and counters for runs, written as JSON lines and in Prometheus text format.
+
+Spans pick up ambient tags such as server and account set with tags(), so nested code only
+names what it is doing. Nothing is written until configure() is called.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import os
+from threading import Lock
+from time import perf_counter, time
+
+from retry import retry
+
+PHASE_HISTOGRAM = "officiant_phase_seconds"
+SEND_HISTOGRAM = "officiant_send_latency_seconds"
+RETRY_COUNTER = "officiant_retries_total"
+RATE_LIMIT_HISTOGRAM = "officiant_rate_limit_wait_seconds"
+
+BUCKETS = {
+    PHASE_HISTOGRAM: (0.1, 0.5, 1.0, 2.5, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+    SEND_HISTOGRAM: (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+    RATE_LIMIT_HISTOGRAM: (0.0, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0),
+}
+HELP = {
+    PHASE_HISTOGRAM: "Wall time of each phase of a run.",
+    SEND_HISTOGRAM: "Time from sending a message or command to reading its response.",
+    RETRY_COUNTER: "Retries made by functions decorated with counted_retry.",
+    RATE_LIMIT_HISTOGRAM: "Time spent waiting on the rate limiter before an action.",
+}
+
+_tags: ContextVar[dict[str, str]] = ContextVar("metric_tags", default={})
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    buckets: tuple[float, ...]
+    counts: list[int]
+    sum: float
+    count: int
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class Metrics:
+    """Collects histograms and counters, and writes spans and snapshots when configured.
+
+    jsonl_path: every finished span is appended here as one JSON object per line
+    prometheus_path: write_prometheus() replaces this file with the current values
+    """
+
+    jsonl_path: str | None
+    prometheus_path: str | None
+    histograms: dict[str, dict[Labels, Histogram]]
+    counters: dict[str, dict[Labels, float]]
+
+    def __init__(self) -> None:
+        self.jsonl_path = None
+        self.prometheus_path = None
+        self.histograms = {}
+        self.counters = {}
+        self._lock = Lock()
+
+    def configure(
+        self, jsonl_path: str | None = None, prometheus_path: str | None = None
+    ) -> None:
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+
+    def observe(self, name: str, value: float, labels: dict[str, str]) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(BUCKETS.get(name, BUCKETS[PHASE_HISTOGRAM]))
+            series[key].observe(value)
+
+    def increment(self, name: str, labels: dict[str, str], amount: float = 1) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def record_span(self, record: dict) -> None:
+        if self.jsonl_path is None:
+            return
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def write_prometheus(self) -> None:
+        if self.prometheus_path is None:
+            return
+        with self._lock:
+            text = self._prometheus_text()
+        temp_path = f"{self.prometheus_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, self.prometheus_path)
+
+    def _prometheus_text(self) -> str:
+        lines = []
+        for name, series in sorted(self.histograms.items()):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            for labels, histogram in sorted(series.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    bucket_labels = labels + (("le", f"{bound:g}"),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                inf_labels = labels + (("le", "+Inf"),)
+                lines.append(f"{name}_bucket{_format_labels(inf_labels)} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for name, series in sorted(self.counters.items()):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} counter"]
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def tags(**new_tags: str):
+    """Adds tags to every span and retry counted inside this block, including nested calls."""
+    token = _tags.set({**_tags.get(), **{k: str(v) for k, v in new_tags.items()}})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def current_tags() -> dict[str, str]:
+    return dict(_tags.get())
+
+
+@contextmanager
+def span(name: str, histogram: str = PHASE_HISTOGRAM, **span_tags: str):
+    """Times the block, records it in histogram and appends it to the spans file."""
+    started_at = time()
+    started = perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record_span(
+            name, histogram, started_at, perf_counter() - started, error, **span_tags
+        )
+
+
+def record_span(
+    name: str,
+    histogram: str,
+    started_at: float,
+    duration: float,
+    error: str | None = None,
+    **span_tags: str,
+) -> None:
+    """Records a span timed outside of a single block, like span does when its block ends.
+    started_at: the wall clock time it started, from time.time()"""
+    labels = {**_tags.get(), **{k: str(v) for k, v in span_tags.items()}, "span": name}
+    METRICS.observe(histogram, duration, labels)
+    METRICS.record_span(
+        {**labels, "start": started_at, "seconds": round(duration, 6), "error": error}
+    )
+
+
+def observe(histogram: str, value: float, **observe_tags: str) -> None:
+    """Records value in histogram, tagged like a span started here would be."""
+    METRICS.observe(
+        histogram, value, {**_tags.get(), **{k: str(v) for k, v in observe_tags.items()}}
+    )
+
+
+class _RetryLogger:
+    """Stands in for the logger retry warns with, counting each retry before logging it."""
+
+    def __init__(self, function_name: str) -> None:
+        self.function_name = function_name
+
+    def warning(self, message, *args) -> None:
+        METRICS.increment(RETRY_COUNTER, {**_tags.get(), "function": self.function_name})
+        logging.warning(f"{self.function_name}: {message}", *args)
+
+
+def counted_retry(exceptions=Exception, tries=-1, delay=0, **kwargs):
+    """retry that also counts each retry in RETRY_COUNTER, tagged by the decorated function."""
+
+    def decorator(func):
+        return retry(
+            exceptions, tries, delay, logger=_RetryLogger(func.__qualname__), **kwargs
+        )(func)
+
+    return decorator
+
+
+__all__ = [
+    "METRICS",
+    "counted_retry",
+    "current_tags",
+    "observe",
+    "record_span",
+    "span",
+    "tags",
+]
@@ -1,8 +1,16 @@
-import logging
-import sched
-import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import logging
+from config import ConfigStore
+from constants import Wait
 from discord_elements import Server
+from planner import RunPlanner
+from sessions import SessionManager
+
+
+CONFIG_POLL_SECONDS = 10
+MAX_WATCHED_SERVERS = 32
 
 
 def get_seconds_until_minute_of_hour(
@@ -18,23 +26,268 @@ def get_seconds_until_minute_of_hour(
     return (later - now).seconds
 
 
-def schedule_rolls(
-    scheduler: sched.scheduler, server: Server, starting_up: bool = True
+async def run_rolls(
+    server: Server,
+    due: datetime.datetime,
+    limit: asyncio.Semaphore,
+    sessions: SessionManager | None,
+    planner: RunPlanner | None = None,
+    watchers: ThreadPoolExecutor | None = None,
+    prewarm_seconds: float = 0,
+):
+    async with limit:
+        started = datetime.datetime.now()
+        logging.info(
+            f"'{server.name}' was due at {due:%H:%M:%S} and started at {started:%H:%M:%S}, "
+            f"{(started - due).total_seconds():.1f}s late"
+        )
+        try:
+            await asyncio.to_thread(server.do_rolls, sessions)
+        except Exception:
+            logging.error(f"Problem rolling on {server.name}", exc_info=True)
+        if planner is not None:
+            planner.record(server)
+    if watchers is not None and sessions is not None:
+        # stop a check before the next run's prewarm
+        until = due + datetime.timedelta(
+            hours=1, seconds=-(prewarm_seconds + Wait.WATCH_CHECK)
+        )
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                watchers, server.watch, sessions, until
+            )
+        except Exception:
+            logging.error(f"Problem watching {server.name}", exc_info=True)
+
+
+async def sleep_until(moment: datetime.datetime):
+    await asyncio.sleep(max(0.0, (moment - datetime.datetime.now()).total_seconds()))
+
+
+async def prewarm(server: Server, due: datetime.datetime, sessions: SessionManager):
+    started = datetime.datetime.now()
+    # watches elsewhere stay off the accounts until the run takes them
+    hold_seconds = (due - started).total_seconds() + Wait.WATCH_CHECK
+    try:
+        ready = await asyncio.to_thread(server.prewarm, sessions, hold_seconds)
+    except Exception:
+        logging.error(f"Problem prewarming {server.name}", exc_info=True)
+        return
+    finished = datetime.datetime.now()
+    logging.info(
+        f"'{server.name}' prewarmed in {(finished - started).total_seconds():.1f}s, "
+        f"{(due - finished).total_seconds():.1f}s before it is due, "
+        f"{len(ready)} of {len(server.accounts)} accounts ready"
+    )
+
+
+async def schedule_rolls(
+    server: Server,
+    limit: asyncio.Semaphore,
+    sessions: SessionManager | None = None,
+    planner: RunPlanner | None = None,
+    running: set[asyncio.Task] | None = None,
+    starting_up: bool = True,
+    prewarm_seconds: float = 0,
+    watchers: ThreadPoolExecutor | None = None,
+    pending: dict[str, datetime.datetime] | None = None,
 ):
-    seconds_to_wait = get_seconds_until_minute_of_hour(
-        server.minute_of_hour_to_roll, starting_up
+    """Starts a run for the server every hour without waiting on the previous one to finish.
+    With a planner, runs with nothing to do are skipped or moved to when there is.
+
+    running: holds the started runs, so they finish even if this schedule is cancelled
+    prewarm_seconds: with sessions, open each account's channel this long before the run
+    watchers: with sessions, watch the channel for other people's rolls between runs
+    pending: runs decided on but not started yet, by server name. A schedule started for a
+        server with one picks it up, so a cancelled schedule's run is not lost.
+    """
+    if running is None:
+        running = set()
+    if pending is None:
+        pending = {}
+    lead = datetime.timedelta(seconds=prewarm_seconds if sessions is not None else 0)
+    while True:
+        due = pending.get(server.name)
+        if due is not None:
+            logging.info(f"Resuming '{server.name}', due at {due:%H:%M:%S}")
+        else:
+            seconds_to_wait = get_seconds_until_minute_of_hour(
+                server.minute_of_hour_to_roll, starting_up
+            )
+            starting_up = False
+            due = datetime.datetime.now() + datetime.timedelta(seconds=seconds_to_wait)
+            logging.info(f"Scheduled '{server.name}' for {seconds_to_wait} seconds from now")
+            await sleep_until(due - lead)
+            if planner is not None:
+                useful_at = planner.next_useful_run(server, due)
+                if useful_at >= due + datetime.timedelta(hours=1):
+                    logging.info(
+                        f"Skipping '{server.name}', nothing to do until {useful_at:%H:%M:%S}"
+                    )
+                    await sleep_until(due + datetime.timedelta(seconds=1))
+                    continue
+                if useful_at > due:
+                    logging.info(f"Moving '{server.name}' to {useful_at:%H:%M:%S}")
+                    due = useful_at
+            pending[server.name] = due
+        await sleep_until(due - lead)
+        if lead and datetime.datetime.now() < due:
+            await prewarm(server, due, sessions)
+        await sleep_until(due)
+        pending.pop(server.name, None)
+        job = asyncio.create_task(
+            run_rolls(server, due, limit, sessions, planner, watchers, prewarm_seconds)
+        )
+        running.add(job)
+        job.add_done_callback(running.discard)
+        # step past the scheduled second so the next run is an hour out
+        await asyncio.sleep(1)
+
+
+def _set_up_executor(max_concurrent_servers: int) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(max_concurrent_servers, thread_name_prefix="server")
     )
-    logging.info(f"Scheduled '{server.name}' for {seconds_to_wait} seconds from now")
-    scheduler.enter(seconds_to_wait, 1, server.do_rolls, ())
-    scheduler.enter(seconds_to_wait, 2, schedule_rolls, (scheduler, server, False))
-    pass
+    return asyncio.Semaphore(max_concurrent_servers)
+
 
+def _set_up_watchers(watch: bool) -> ThreadPoolExecutor | None:
+    if not watch:
+        return None
+    return ThreadPoolExecutor(MAX_WATCHED_SERVERS, thread_name_prefix="watch")
 
-def schedule_rolls_for_servers(servers: list[Server]):
-    scheduler = sched.scheduler(time.time, time.sleep)
-    for server in servers:
-        schedule_rolls(scheduler, server)
-    scheduler.run()
+
+async def run_schedule(
+    servers: list[Server],
+    sessions: SessionManager | None,
+    max_concurrent_servers: int,
+    planner: RunPlanner | None,
+    prewarm_seconds: float = 0,
+    watch: bool = False,
+):
+    limit = _set_up_executor(max_concurrent_servers)
+    watchers = _set_up_watchers(watch)
+    await asyncio.gather(
+        *(
+            schedule_rolls(
+                server,
+                limit,
+                sessions,
+                planner,
+                prewarm_seconds=prewarm_seconds,
+                watchers=watchers,
+            )
+            for server in servers
+        )
+    )
+
+
+async def run_config_schedule(
+    store: ConfigStore,
+    sessions: SessionManager | None,
+    max_concurrent_servers: int,
+    planner: RunPlanner | None,
+    prewarm_seconds: float = 0,
+    watch: bool = False,
+):
+    """Schedules the servers in store, rescheduling them whenever the config is reloaded.
+    Runs and watches already started finish with the config they started with. Runs already
+    decided on, moved or prewarming, keep their time."""
+    limit = _set_up_executor(max_concurrent_servers)
+    watchers = _set_up_watchers(watch)
+    running: set[asyncio.Task] = set()
+    pending: dict[str, datetime.datetime] = {}
+
+    def start(starting_up: bool) -> list[asyncio.Task]:
+        return [
+            asyncio.create_task(
+                schedule_rolls(
+                    server,
+                    limit,
+                    sessions,
+                    planner,
+                    running,
+                    starting_up,
+                    prewarm_seconds,
+                    watchers,
+                    pending,
+                )
+            )
+            for server in store.current.servers
+        ]
+
+    schedules = start(starting_up=True)
+    try:
+        while True:
+            await asyncio.sleep(CONFIG_POLL_SECONDS)
+            if store.reload_if_changed():
+                for schedule in schedules:
+                    schedule.cancel()
+                schedules = start(starting_up=False)
+    finally:
+        for schedule in schedules:
+            schedule.cancel()
+
+
+def schedule_rolls_for_servers(
+    servers: list[Server],
+    sessions: SessionManager | None = None,
+    max_concurrent_servers: int = 4,
+    planner: RunPlanner | None = None,
+    prewarm_seconds: float = 0,
+    watch: bool = False,
+):
+    """Rolls on each server every hour. Pass sessions to keep browsers warm between runs,
+    and a planner to skip runs that the last known timers say would do nothing.
+    With sessions, prewarm_seconds before each run every account's browser is launched or
+    refreshed and the channel opened, so the first roll goes out right on time.
+    With sessions and watch, each server's accounts claim and react to other people's rolls
+    between runs, with the same rules as their own.
+
+    Servers run at the same time, up to max_concurrent_servers. An account is never driven
+    by two servers at once: the second one waits for the first to finish with it.
+    """
+    try:
+        asyncio.run(
+            run_schedule(
+                servers,
+                sessions,
+                max(1, max_concurrent_servers),
+                planner,
+                prewarm_seconds,
+                watch,
+            )
+        )
+    finally:
+        if sessions is not None:
+            sessions.close_all()
+
+
+def schedule_rolls_from_config(
+    store: ConfigStore,
+    sessions: SessionManager | None = None,
+    max_concurrent_servers: int = 4,
+    planner: RunPlanner | None = None,
+    prewarm_seconds: float = 0,
+    watch: bool = False,
+):
+    """Like schedule_rolls_for_servers, but takes the servers from store and picks up changes to
+    its files between runs, keeping warm sessions and planner timers."""
+    try:
+        asyncio.run(
+            run_config_schedule(
+                store,
+                sessions,
+                max(1, max_concurrent_servers),
+                planner,
+                prewarm_seconds,
+                watch,
+            )
+        )
+    finally:
+        if sessions is not None:
+            sessions.close_all()
 
 
-__all__ = [schedule_rolls_for_servers]
+__all__ = [schedule_rolls_for_servers, schedule_rolls_from_config]
@@ -0,0 +1,537 @@
+"""JavaScript run inside the Discord page through WebDriver.execute_script.
+
+Snapshots are plain data describing a chat message. When given the fingerprints of messages
+Python has already parsed, unchanged messages come back as {html_id, fingerprint, unchanged}.
+
+Each channel gets a state object at window.__officiant[channel_id] holding a MutationObserver
+that records which chat message items were added or changed, passes them to any listeners
+(such as the claim agent) and then wakes any pending waits.
+"""
+
+PARSE_MESSAGE_JS = """
+function officiantParseMessage(li, text) {
+    const lines = (text === undefined ? li.innerText : text).split('\\n');
+    const parsed = {html_id: li.id, lines: lines, invoker: null, command: null, content: ''};
+    if (lines.length > 2 && lines[1].trim() === 'used') {
+        parsed.invoker = lines[0].replace(/^@/, '');
+        parsed.command = lines[2].trim();
+        parsed.content = lines.slice(6).join('\\n');
+    }
+    return parsed;
+}
+function officiantButtonName(button) {
+    const img = button.querySelector('img');
+    const name = button.getAttribute('aria-label')
+        || (img && (img.getAttribute('aria-label') || img.alt))
+        || button.innerText;
+    return (name || '').trim().replace(/^:|:$/g, '');
+}
+function officiantFingerprint(text, buttonCount) {
+    let hash = 0;
+    for (let i = 0; i < text.length; i++) {
+        hash = (hash * 31 + text.charCodeAt(i)) | 0;
+    }
+    return text.length + ':' + hash + ':' + buttonCount;
+}
+function officiantShowsKakera(li) {
+    // the kakera emoji in a roll's embed, as opposed to one on a button under it
+    return Array.from(li.querySelectorAll('img')).some((img) => !img.closest('button')
+        && /^:?kakera/.test(img.getAttribute('aria-label') || img.alt || ''));
+}
+function officiantPrompt(li) {
+    // the last line of the nearest earlier message not posted by a bot, which a bot's text
+    // command response is answering
+    let item = li.previousElementSibling;
+    for (let i = 0; item && i < 10; i++, item = item.previousElementSibling) {
+        if (!item.id.startsWith('chat-messages-')) {
+            continue;
+        }
+        const lines = item.innerText.split('\n');
+        if (lines.length > 2 && ['used', 'BOT'].includes(lines[1].trim())) {
+            continue;
+        }
+        return lines.map((line) => line.trim()).filter(Boolean).pop() || null;
+    }
+    return null;
+}
+function officiantSnapshot(li, known) {
+    const text = li.innerText;
+    const buttons = li.querySelectorAll('button[role="button"]');
+    const fingerprint = officiantFingerprint(text, buttons.length);
+    if (known && known[li.id] === fingerprint) {
+        return {html_id: li.id, fingerprint: fingerprint, unchanged: true};
+    }
+    const snapshot = officiantParseMessage(li, text);
+    const time = li.querySelector('time');
+    snapshot.datetime = time ? time.getAttribute('datetime') : null;
+    snapshot.buttons = Array.from(buttons, officiantButtonName);
+    snapshot.kakera_icon = officiantShowsKakera(li);
+    snapshot.prompt = snapshot.lines.length > 1 && snapshot.lines[1].trim() === 'BOT'
+        ? officiantPrompt(li) : null;
+    snapshot.fingerprint = fingerprint;
+    return snapshot;
+}
+function officiantSnowflakeAfter(htmlId, afterId) {
+    const id = htmlId.split('-').pop();
+    return BigInt(id) > BigInt(afterId || '0');
+}
+"""
+
+INSTALL_MESSAGE_OBSERVER_JS = """
+const channelId = arguments[0];
+window.__officiant = window.__officiant || {};
+const existing = window.__officiant[channelId];
+if (existing && existing.connected) {
+    return true;
+}
+const prefix = 'chat-messages-' + channelId + '-';
+const selector = 'li[id^="' + prefix + '"]';
+const state = {connected: true, version: 0, changed: [], listeners: [], waiters: []};
+const touch = (li) => {
+    state.version += 1;
+    state.changed.push(li.id);
+    if (state.changed.length > 500) {
+        state.changed.splice(0, state.changed.length - 500);
+    }
+};
+state.observer = new MutationObserver((mutations) => {
+    const touched = new Set();
+    for (const mutation of mutations) {
+        const target = mutation.target.nodeType === 1 ? mutation.target : mutation.target.parentElement;
+        const owner = target && target.closest(selector);
+        if (owner) {
+            touched.add(owner);
+        }
+        for (const node of mutation.addedNodes) {
+            if (node.nodeType !== 1) {
+                continue;
+            }
+            if (node.matches(selector)) {
+                touched.add(node);
+            }
+            node.querySelectorAll(selector).forEach((li) => touched.add(li));
+        }
+    }
+    if (touched.size === 0) {
+        return;
+    }
+    touched.forEach(touch);
+    for (const listener of state.listeners) {
+        touched.forEach(listener);
+    }
+    for (const wake of state.waiters.splice(0)) {
+        wake();
+    }
+});
+state.observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+window.__officiant[channelId] = state;
+return true;
+"""
+
+WAIT_FOR_RESPONSE_JS = (
+    PARSE_MESSAGE_JS
+    + """
+const [channelId, afterId, command, invoker, timeoutMs, skipIds, settleMs] = arguments;
+const done = arguments[arguments.length - 1];
+const skip = new Set(skipIds);
+const state = (window.__officiant || {})[channelId];
+if (!state) {
+    done({status: 'missing'});
+    return;
+}
+const selector = 'li[id^="chat-messages-' + channelId + '-"]';
+// the oldest response not already taken, so pipelined commands are answered in order
+const findResponse = () => {
+    const items = document.querySelectorAll(selector);
+    let oldest = null;
+    for (let i = items.length - 1; i >= 0; i--) {
+        const li = items[i];
+        if (!officiantSnowflakeAfter(li.id, afterId)) {
+            break;
+        }
+        if (skip.has(li.id)) {
+            continue;
+        }
+        const parsed = officiantParseMessage(li);
+        if (parsed.command !== command || (invoker && parsed.invoker !== invoker)) {
+            continue;
+        }
+        if (parsed.content.trim() === '' || parsed.content.startsWith('Sending command...')) {
+            continue;
+        }
+        oldest = li;
+    }
+    return oldest;
+};
+let finished = false;
+const finish = (result) => {
+    if (!finished) {
+        finished = true;
+        done(result);
+    }
+};
+const found = (li) => finish({status: 'found', element: li, snapshot: officiantSnapshot(li)});
+// buttons can render a moment after the embed, so give them up to settleMs to show up
+const settle = (li) => {
+    if (li.querySelector('button[role="button"]') || !settleMs) {
+        found(li);
+        return;
+    }
+    setTimeout(() => found(li), settleMs);
+    const recheck = () => {
+        if (finished) {
+            return;
+        }
+        if (li.querySelector('button[role="button"]')) {
+            found(li);
+        } else {
+            state.waiters.push(recheck);
+        }
+    };
+    state.waiters.push(recheck);
+};
+const check = () => {
+    const li = findResponse();
+    if (li) {
+        settle(li);
+    } else if (!finished) {
+        state.waiters.push(check);
+    }
+};
+setTimeout(() => finish({status: 'timeout'}), timeoutMs);
+check();
+"""
+)
+
+# Resolves once no message that counts as activity has been added or changed for quietMs.
+# Returns {status: 'busy', last_activity} when timeoutMs runs out first, so Python can keep
+# waiting with another call that passes last_activity back in as since.
+WAIT_FOR_QUIET_JS = (
+    PARSE_MESSAGE_JS
+    + """
+const [channelId, quietMs, ignoreInvokers, mudaeOnly, since, timeoutMs] = arguments;
+const done = arguments[arguments.length - 1];
+const state = (window.__officiant || {})[channelId];
+if (!state) {
+    done({status: 'missing'});
+    return;
+}
+const ignored = new Set(ignoreInvokers);
+const counts = (li) => {
+    const parsed = officiantParseMessage(li);
+    const fromMudae = parsed.command !== null || (parsed.lines.length > 1 && parsed.lines[1].trim() === 'BOT');
+    if (mudaeOnly && !fromMudae) {
+        return false;
+    }
+    return !(parsed.invoker && ignored.has(parsed.invoker));
+};
+let lastActivity = since || 0;
+if (!since) {
+    const items = document.querySelectorAll('li[id^="chat-messages-' + channelId + '-"]');
+    for (let i = items.length - 1; i >= 0 && i >= items.length - 50; i--) {
+        if (counts(items[i])) {
+            const time = items[i].querySelector('time');
+            lastActivity = time ? Date.parse(time.getAttribute('datetime')) : Date.now();
+            break;
+        }
+    }
+}
+const started = Date.now();
+let timer = null;
+let finished = false;
+const listener = (li) => {
+    if (counts(li)) {
+        lastActivity = Date.now();
+    }
+};
+const finish = (result) => {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    clearTimeout(timer);
+    const index = state.listeners.indexOf(listener);
+    if (index >= 0) {
+        state.listeners.splice(index, 1);
+    }
+    done(result);
+};
+const check = () => {
+    const now = Date.now();
+    const quietAt = lastActivity + quietMs;
+    if (now >= quietAt) {
+        finish({status: 'quiet', last_activity: lastActivity});
+    } else if (now - started >= timeoutMs) {
+        finish({status: 'busy', last_activity: lastActivity});
+    } else {
+        timer = setTimeout(check, Math.min(quietAt, started + timeoutMs) - now);
+    }
+};
+state.listeners.push(listener);
+check();
+"""
+)
+
+# Returns snapshots of the messages added or changed since the observer's version was cursor,
+# waiting up to timeoutMs for one if there are none yet. A null cursor starts from now.
+STREAM_MESSAGES_JS = (
+    PARSE_MESSAGE_JS
+    + """
+const [channelId, cursor, known, timeoutMs] = arguments;
+const done = arguments[arguments.length - 1];
+const state = (window.__officiant || {})[channelId];
+if (!state) {
+    done({status: 'missing'});
+    return;
+}
+if (cursor === null || cursor > state.version) {
+    done({status: 'started', version: state.version});
+    return;
+}
+const collect = () => {
+    const count = state.version - cursor;
+    const ids = new Set(state.changed.slice(Math.max(0, state.changed.length - count)));
+    const snapshots = [];
+    for (const id of ids) {
+        const li = document.getElementById(id);
+        if (li) {
+            snapshots.push(officiantSnapshot(li, known));
+        }
+    }
+    return {status: 'changed', version: state.version, snapshots: snapshots};
+};
+if (state.version > cursor) {
+    done(collect());
+    return;
+}
+let finished = false;
+const wake = () => {
+    if (!finished) {
+        finished = true;
+        done(collect());
+    }
+};
+state.waiters.push(wake);
+setTimeout(() => {
+    if (!finished) {
+        finished = true;
+        const index = state.waiters.indexOf(wake);
+        if (index >= 0) {
+            state.waiters.splice(index, 1);
+        }
+        done({status: 'timeout', version: state.version});
+    }
+}, timeoutMs);
+"""
+)
+
+# Replaces the message box text with a slash command in one edit, then resolves true once
+# Discord shows the command as recognized, or false if it doesn't within the timeout.
+FAST_COMMAND_INPUT_JS = """
+const [box, text, param, timeoutMs] = arguments;
+const done = arguments[arguments.length - 1];
+const recognized = () => document.querySelector('div[class^="attachedBars_"]');
+box.focus();
+document.execCommand('selectAll', false, null);
+document.execCommand('delete', false, null);
+document.execCommand('insertText', false, text);
+let finished = false;
+const observer = new MutationObserver(() => {
+    if (recognized()) {
+        finish(true);
+    }
+});
+const finish = (ok) => {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    observer.disconnect();
+    if (ok && param) {
+        document.execCommand('insertText', false, param);
+    }
+    done(ok);
+};
+observer.observe(document.body, {childList: true, subtree: true, attributes: true});
+setTimeout(() => finish(false), timeoutMs);
+if (recognized()) {
+    finish(true);
+}
+"""
+
+EXTRACT_MESSAGES_JS = (
+    PARSE_MESSAGE_JS
+    + """
+const [channelId, limit, known] = arguments;
+const items = Array.from(document.querySelectorAll('li[id^="chat-messages-' + channelId + '-"]'));
+items.reverse();
+return (limit === null ? items : items.slice(0, limit)).map((li) => officiantSnapshot(li, known));
+"""
+)
+
+EXTRACT_MESSAGE_BY_ID_JS = (
+    PARSE_MESSAGE_JS
+    + """
+const [htmlId, known] = arguments;
+const li = document.getElementById(htmlId);
+return li ? officiantSnapshot(li, known) : null;
+"""
+)
+
+EXTRACT_MESSAGES_BY_ID_JS = (
+    PARSE_MESSAGE_JS
+    + """
+const [htmlIds, known] = arguments;
+return htmlIds.map((htmlId) => {
+    const li = document.getElementById(htmlId);
+    return li ? officiantSnapshot(li, known) : null;
+});
+"""
+)
+
+FIND_BUTTON_JS = (
+    PARSE_MESSAGE_JS
+    + """
+const [htmlId, name] = arguments;
+const li = document.getElementById(htmlId);
+if (!li) {
+    return null;
+}
+const buttons = Array.from(li.querySelectorAll('button[role="button"]'));
+return buttons.find((button) => officiantButtonName(button) === name) || null;
+"""
+)
+
+EXTRACT_ELEMENT_JS = (
+    PARSE_MESSAGE_JS
+    + """
+return officiantSnapshot(arguments[0]);
+"""
+)
+
+# Clicks wish and kakera buttons on the configured account's rolls as soon as they render.
+# Each click is queued for Python to collect with DRAIN_AGENT_CLICKS_JS.
+INSTALL_CLAIM_AGENT_JS = (
+    PARSE_MESSAGE_JS
+    + """
+const [channelId, config] = arguments;
+const state = (window.__officiant || {})[channelId];
+if (!state) {
+    return false;
+}
+// wishlist.normalize, for text that decomposes to ASCII and accents, where the two are known
+// to agree. Other text gives null and is left to Python, so the agent only ever claims what
+// Python would.
+const normalize = (text) => {
+    const decomposed = text.normalize('NFKD');
+    if (!/^[\\x00-\\x7f\\u0300-\\u0344\\u0346-\\u034e\\u0350-\\u036f]*$/.test(decomposed)) {
+        return null;
+    }
+    return decomposed.replace(/[\\u0300-\\u036f]/g, '').toLowerCase()
+        .split(/[\\s\\x1c-\\x1f]+/).filter(Boolean).join(' ');
+};
+const configure = (agent, changes) => {
+    Object.assign(agent.config, changes);
+    agent.wishers = new Set(agent.config.wishers);
+    agent.names = new Set(agent.config.names);
+    agent.series = new Set(agent.config.series);
+    agent.kakera = new Set(agent.config.kakera);
+    agent.rollCommands = new Set(agent.config.rollCommands);
+};
+if (state.agent) {
+    configure(state.agent, config);
+    return true;
+}
+const agent = {config: {}, clicks: [], done: {}};
+configure(agent, config);
+const key = (text) => {
+    const normalized = normalize(text);
+    if (normalized === null) {
+        return null;
+    }
+    return agent.config.aliases[normalized] || normalized;
+};
+// the same steps as CharacterRoll.__init__
+const parseRoll = (content) => {
+    const lines = content.split('\\n');
+    const roll = {wishedBy: [], owned: false, seriesLines: []};
+    if (lines[0].startsWith('Wished by ')) {
+        roll.wishedBy = lines.shift().replace(/\\s*\\(edited\\)$/, '').slice('Wished by '.length)
+            .split(',').map((name) => name.trim().replace(/^@/, ''));
+    }
+    roll.name = lines.shift() || '';
+    const remove = (test) => {
+        const index = lines.findIndex(test);
+        return index >= 0 ? lines.splice(index, 1) : null;
+    };
+    roll.owned = remove((line) => line.startsWith('Belongs to ')) !== null;
+    remove((line) => line.startsWith('Claims: #'));
+    remove((line) => /^\\d+$/.test(line));
+    if (lines.length && /\\/.*- \\d+ ka/.test(lines[lines.length - 1])) {
+        lines.pop();
+    }
+    if (lines.length && lines[lines.length - 1] === 'Belongs to ') {
+        lines.pop();
+    }
+    roll.seriesLines = lines.filter(Boolean);
+    roll.series = lines.length ? roll.seriesLines.join(' ') : 'Meme';
+    return roll;
+};
+const wanted = (roll) => roll.wishedBy.some((name) => agent.wishers.has(name))
+    || agent.names.has(key(roll.name))
+    || agent.series.has(key(roll.series))
+    || roll.seriesLines.some((line) => agent.series.has(key(line)));
+const click = (li, button, action, kind) => {
+    agent.done[li.id].push(action);
+    button.click();
+    agent.clicks.push({html_id: li.id, action: action, kind: kind});
+};
+agent.listener = (li) => {
+    const parsed = officiantParseMessage(li);
+    if (parsed.invoker !== agent.config.invoker || !agent.rollCommands.has(parsed.command)) {
+        return;
+    }
+    if (parsed.content.trim() === '' || parsed.content.startsWith('Sending command...')) {
+        return;
+    }
+    agent.done[li.id] = agent.done[li.id] || [];
+    let roll = null;
+    for (const button of li.querySelectorAll('button[role="button"]')) {
+        const action = officiantButtonName(button);
+        if (agent.done[li.id].includes(action) || button.disabled) {
+            continue;
+        }
+        if (action === agent.config.wishAction && agent.config.canClaim) {
+            roll = roll || parseRoll(parsed.content);
+            if (!roll.owned && wanted(roll)) {
+                agent.config.canClaim = false;
+                click(li, button, action, 'wish');
+            }
+        } else if (agent.kakera.has(action)) {
+            click(li, button, action, 'kakera');
+        }
+    }
+};
+state.listeners.push(agent.listener);
+state.agent = agent;
+return true;
+"""
+)
+
+# Removes the claim agent, so a warm page stops clicking once the run that started it is over.
+UNINSTALL_CLAIM_AGENT_JS = """
+const state = (window.__officiant || {})[arguments[0]];
+if (state && state.agent) {
+    state.listeners = state.listeners.filter((listener) => listener !== state.agent.listener);
+    delete state.agent;
+}
+return true;
+"""
+
+DRAIN_AGENT_CLICKS_JS = """
+const state = (window.__officiant || {})[arguments[0]];
+if (!state || !state.agent) {
+    return [];
+}
+return state.agent.clicks.splice(0);
+"""
@@ -0,0 +1,103 @@
+"""Decides when a server's hourly run is worth launching, from the timers its accounts last saw."""
+
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+from threading import Lock
+
+from discord_elements import Server
+
+TIMERS = ["rolls", "daily", "daily_kakera", "pokeslot"]
+
+
+class RunPlanner:
+    """Remembers when each account's rolls, daily, dk and pokeslot are next available per server.
+
+    A run is only skipped or moved when the rolls of every account on the server are known to
+    be unavailable at the scheduled time. Timers that are not known never hold a run back.
+    A run is never moved past the next claim reset, which the minute to roll is picked
+    around. A run that would have to move that far is skipped instead.
+
+    path: JSON file the timers are kept in between restarts. None to keep them in memory only.
+    """
+
+    path: str | None
+    _timers: dict[str, dict[str, dict[str, str | bool | None]]]
+
+    def __init__(self, path: str | None = "timers.json") -> None:
+        self.path = path
+        self._timers = {}
+        self._lock = Lock()
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._timers = json.load(f)
+            except (OSError, ValueError):
+                logging.warning(f"Unable to read timers from {path}, starting fresh")
+
+    def record(self, server: Server) -> None:
+        """Stores the timers from the server's last run and saves them."""
+        now = datetime.now()
+        with self._lock:
+            accounts = self._timers.setdefault(str(server.server_id), {})
+            for name, state in server.last_timers.items():
+                timers = {
+                    timer: at.isoformat() if at is not None else None
+                    for timer, at in state.available_at(now).items()
+                }
+                minutes = state.claim_reset_minutes
+                timers["claim"] = (
+                    (now + timedelta(minutes=minutes)).isoformat()
+                    if minutes is not None
+                    else None
+                )
+                timers["can_react"] = state.can_react
+                accounts[name] = timers
+            self._save()
+
+    def next_useful_run(self, server: Server, due: datetime) -> datetime:
+        """The first moment from due on when a run would have something to do, or an hour
+        after due if that is past the next claim reset."""
+        with self._lock:
+            accounts = self._timers.get(str(server.server_id), {})
+            earliest = []
+            claim_resets = []
+            for account in server.accounts:
+                timers = accounts.get(account.name)
+                if timers is None or timers["rolls"] is None:
+                    return due
+                # the same gates as Server._do_non_rolls
+                enabled = {
+                    "rolls": True,
+                    "daily": server.options.do_daily,
+                    "daily_kakera": server.options.do_daily_kakera
+                    and not timers.get("can_react", False),
+                    "pokeslot": server.options.do_pokeslot,
+                }
+                earliest.append(
+                    min(
+                        datetime.fromisoformat(timers[timer])
+                        for timer in TIMERS
+                        if enabled[timer] and timers[timer] is not None
+                    )
+                )
+                if timers.get("claim") is not None:
+                    claim_reset = datetime.fromisoformat(timers["claim"])
+                    if claim_reset > due:
+                        claim_resets.append(claim_reset)
+        useful_at = max(due, min(earliest, default=due))
+        if claim_resets and useful_at > min(claim_resets):
+            return due + timedelta(hours=1)
+        return useful_at
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self._timers, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+__all__ = ["RunPlanner"]
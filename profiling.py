@@ -0,0 +1,139 @@
+"""Opt-in counting and timing of every WebDriver round trip, grouped by the code that caused it.
+
+WebElement commands go through the execute method of the driver that found them, so wrapping
+the driver's execute also covers every element, including property reads like element.text.
+"""
+
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime
+import logging
+import os
+import sys
+from threading import Lock
+from time import perf_counter
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from metrics import current_tags
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+THIS_FILE = os.path.abspath(__file__)
+
+
+def _calling_site() -> str:
+    """The innermost function of this repository on the stack, outside selenium and decorators."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (
+            filename.startswith(REPO_DIR)
+            and filename != THIS_FILE
+            and "site-packages" not in filename
+        ):
+            return frame.f_code.co_qualname
+        frame = frame.f_back
+    return "unknown"
+
+
+class RoundTripProfiler:
+    """Counts and times WebDriver commands per server, calling site and command.
+
+    enabled: wrap browsers returned by Account.get_firefox_browser
+    profile_dir: also capture cProfile stats of each Server.do_rolls here, with the report
+        beside them. Only the thread running do_rolls is captured, so use max_workers=1.
+    """
+
+    enabled: bool
+    profile_dir: str | None
+    _stats: dict[str, dict[tuple[str, str], list[float]]]
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.profile_dir = None
+        self._stats = {}
+        self._lock = Lock()
+
+    def configure(self, enabled: bool = True, profile_dir: str | None = None) -> None:
+        self.enabled = enabled
+        self.profile_dir = profile_dir
+
+    def wrap(self, driver: WebDriver) -> WebDriver:
+        if not self.enabled:
+            return driver
+        execute = driver.execute
+
+        def profiled_execute(driver_command, params=None):
+            site = _calling_site()
+            started = perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self._record(site, driver_command, perf_counter() - started)
+
+        driver.execute = profiled_execute
+        return driver
+
+    def _record(self, site: str, command: str, seconds: float) -> None:
+        server = current_tags().get("server", "")
+        with self._lock:
+            stats = self._stats.setdefault(server, {}).setdefault((site, command), [0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+
+    @contextmanager
+    def run(self, server: str):
+        """Wraps one server run: captures cProfile stats if asked, then logs the report."""
+        if not self.enabled:
+            yield
+            return
+        profile = cProfile.Profile() if self.profile_dir else None
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                logging.warning(f"Another profile is running, not profiling {server}")
+                profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            report = self.report(server)
+            print(report)
+            logging.info(report)
+            if profile is not None:
+                self._write(server, profile, report)
+
+    def report(self, server: str) -> str:
+        """Formats and clears the round trips recorded for server."""
+        with self._lock:
+            stats = self._stats.pop(server, {})
+        total_count = sum(count for count, _ in stats.values())
+        total_seconds = sum(seconds for _, seconds in stats.values())
+        lines = [
+            f"WebDriver round trips for {server}: {total_count} in {total_seconds:.2f}s",
+            f"{'calling site':<44}{'command':<28}{'count':>7}{'total s':>9}{'mean ms':>9}",
+        ]
+        for (site, command), (count, seconds) in sorted(
+            stats.items(), key=lambda item: -item[1][1]
+        ):
+            lines.append(
+                f"{site:<44}{command:<28}{count:>7}{seconds:>9.2f}{seconds / count * 1000:>9.1f}"
+            )
+        return "\n".join(lines)
+
+    def _write(self, server: str, profile: cProfile.Profile, report: str) -> None:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stem = os.path.join(
+            self.profile_dir,
+            f"{''.join(c if c.isalnum() else '_' for c in server)}-{datetime.now():%Y%m%d-%H%M%S}",
+        )
+        profile.dump_stats(f"{stem}.prof")
+        with open(f"{stem}.txt", "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+PROFILER = RoundTripProfiler()
+
+__all__ = ["PROFILER", "RoundTripProfiler"]
@@ -0,0 +1,108 @@
+"""Token buckets that pace sends, clicks and reacts for every account and channel.
+
+Every action takes a token from its account's bucket and from its channel's bucket, so
+accounts rolling in parallel on one channel share that channel's allowance. Buckets refill
+at a steady rate and hold up to burst tokens, letting a short run of actions go out at once.
+"""
+
+from threading import Lock
+from time import monotonic, sleep
+
+from metrics import RATE_LIMIT_HISTOGRAM, observe
+
+
+class TokenBucket:
+    rate: float
+    burst: int
+    _tokens: float
+    _updated: float
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = monotonic()
+        self._lock = Lock()
+
+    def reserve(self) -> float:
+        """Takes a token, going into debt if there are none, and returns the seconds until it is usable."""
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RateLimiter:
+    """Hands out per-account and per-channel token buckets and waits on them.
+
+    account_rate, account_burst: actions per second for one account, and how many may go at once
+    channel_rate, channel_burst: the same for one channel, across all accounts
+    """
+
+    account_rate: float
+    account_burst: int
+    channel_rate: float
+    channel_burst: int
+    _buckets: dict[tuple[str, str], TokenBucket]
+
+    def __init__(
+        self,
+        account_rate: float = 1.0,
+        account_burst: int = 5,
+        channel_rate: float = 2.0,
+        channel_burst: int = 8,
+    ) -> None:
+        self._lock = Lock()
+        self.configure(account_rate, account_burst, channel_rate, channel_burst)
+
+    def configure(
+        self,
+        account_rate: float = 1.0,
+        account_burst: int = 5,
+        channel_rate: float = 2.0,
+        channel_burst: int = 8,
+    ) -> None:
+        with self._lock:
+            self.account_rate = account_rate
+            self.account_burst = account_burst
+            self.channel_rate = channel_rate
+            self.channel_burst = channel_burst
+            self._buckets = {}
+
+    def acquire(self, account: str, channel: str, action: str) -> float:
+        """Blocks until account may act in channel. Returns the seconds waited."""
+        wait = max(
+            self._bucket("account", account).reserve(),
+            self._bucket("channel", channel).reserve(),
+        )
+        if wait > 0:
+            sleep(wait)
+        observe(RATE_LIMIT_HISTOGRAM, wait, action=action)
+        return wait
+
+    def charge(self, account: str, channel: str, action: str) -> None:
+        """Takes tokens for an action that has already happened, without waiting, so the
+        actions after it are paced as if it had gone through acquire."""
+        self._bucket("account", account).reserve()
+        self._bucket("channel", channel).reserve()
+        observe(RATE_LIMIT_HISTOGRAM, 0.0, action=action)
+
+    def _bucket(self, kind: str, key: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get((kind, key))
+            if bucket is None:
+                if kind == "account":
+                    bucket = TokenBucket(self.account_rate, self.account_burst)
+                else:
+                    bucket = TokenBucket(self.channel_rate, self.channel_burst)
+                self._buckets[(kind, key)] = bucket
+            return bucket
+
+
+RATE_LIMITER = RateLimiter()
+
+__all__ = ["RATE_LIMITER", "RateLimiter", "TokenBucket"]
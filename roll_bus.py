@@ -0,0 +1,132 @@
+"""Shares the rolls one account reads in a channel with every other account watching it.
+
+One account at a time streams the channel and publishes each roll it parses. Every watching
+account gets the roll on its own queue and reacts to kakera for itself, but a claim is only
+offered to one of them: the first that wants the character and can claim, or failing that
+the first that could after $rt.
+"""
+
+from collections import OrderedDict
+from queue import Queue
+from threading import Lock
+from time import monotonic
+from typing import TYPE_CHECKING, Callable
+
+from constants import Wait
+
+if TYPE_CHECKING:
+    from discord_elements import AccountState, CharacterRoll
+
+
+class Subscription:
+    """One account's view of a RollBus.
+
+    wants: whether the account would claim a roll, given it can claim
+    state: the account's predicted timers, kept up to date by the account
+    rolls: published rolls, with whether this account is the one to claim it
+    """
+
+    name: str
+    wants: Callable[["CharacterRoll"], bool]
+    state: "AccountState | None"
+    rolls: Queue[tuple["CharacterRoll", bool]]
+
+    def __init__(self, name: str, wants: Callable[["CharacterRoll"], bool]) -> None:
+        self.name = name
+        self.wants = wants
+        self.state = None
+        self.rolls = Queue()
+
+
+class RollBus:
+    """The rolls seen in one channel, published by whichever account leads."""
+
+    LEAD_TIMEOUT = 2 * Wait.WATCH_CHECK
+
+    _subscriptions: dict[str, Subscription]
+    _leader: str | None
+    _led_at: float
+
+    def __init__(self) -> None:
+        self._subscriptions = {}
+        self._leader = None
+        self._led_at = 0.0
+        self._lock = Lock()
+
+    def subscribe(
+        self, name: str, wants: Callable[["CharacterRoll"], bool]
+    ) -> Subscription:
+        with self._lock:
+            subscription = Subscription(name, wants)
+            self._subscriptions[name] = subscription
+            return subscription
+
+    def unsubscribe(self, name: str) -> None:
+        with self._lock:
+            self._subscriptions.pop(name, None)
+            if self._leader == name:
+                self._leader = None
+
+    def lead(self, name: str) -> bool:
+        """True if name should stream the channel and publish, keeping the lead while it
+        comes back for it. A leader that stops coming back loses it after LEAD_TIMEOUT."""
+        with self._lock:
+            now = monotonic()
+            if (
+                self._leader is None
+                or self._leader == name
+                or now - self._led_at > self.LEAD_TIMEOUT
+            ):
+                self._leader = name
+                self._led_at = now
+                return True
+            return False
+
+    def publish(self, roll: "CharacterRoll") -> Subscription | None:
+        """Hands roll to every subscriber. Returns the one offered the claim, if any."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+        claimer = self._route(roll, subscriptions)
+        for subscription in subscriptions:
+            subscription.rolls.put((roll, subscription is claimer))
+        return claimer
+
+    def _route(
+        self, roll: "CharacterRoll", subscriptions: list[Subscription]
+    ) -> Subscription | None:
+        if roll.claimed:
+            return None
+        wanting = [
+            s for s in subscriptions if s.state is not None and s.wants(roll)
+        ]
+        return next((s for s in wanting if s.state.can_claim), None) or next(
+            (s for s in wanting if s.state.can_rt), None
+        )
+
+
+class ClaimLocks:
+    """Rolls one of our accounts has gone for, so two of them never race for one character."""
+
+    MAX_SIZE = 500
+
+    _taken: OrderedDict[str, str]
+
+    def __init__(self) -> None:
+        self._taken = OrderedDict()
+        self._lock = Lock()
+
+    def take(self, html_id: str, account: str) -> bool:
+        """True if account may claim the roll. Only the first ask gets it, so a roll handled
+        again after an edit is not claimed twice either."""
+        with self._lock:
+            if html_id in self._taken:
+                return False
+            self._taken[html_id] = account
+            if len(self._taken) > self.MAX_SIZE:
+                self._taken.popitem(last=False)
+            return True
+
+
+CLAIM_LOCKS = ClaimLocks()
+
+__all__ = ["CLAIM_LOCKS", "ClaimLocks", "RollBus", "Subscription"]
@@ -0,0 +1,243 @@
+"""Long-lived browsers that are reused between scheduled runs."""
+
+import logging
+from threading import Lock
+from time import monotonic, sleep
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from constants import Wait
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+if TYPE_CHECKING:
+    from discord_elements import Account
+
+_profile_locks: dict[str, Lock] = {}
+_profile_locks_guard = Lock()
+
+NAVIGATE_IN_PLACE_JS = """
+window.history.pushState({}, '', arguments[0]);
+window.dispatchEvent(new PopStateEvent('popstate', {state: {}}));
+"""
+
+
+def profile_lock(firefox_profile: str) -> Lock:
+    """The lock to hold while driving a Firefox profile, so it never runs twice at once."""
+    with _profile_locks_guard:
+        return _profile_locks.setdefault(firefox_profile, Lock())
+
+
+class Tab:
+    """A browser tab showing one channel."""
+
+    session: "BrowserSession"
+    handle: str
+    url: str
+
+    def __init__(self, session: "BrowserSession", handle: str, url: str) -> None:
+        self.session = session
+        self.handle = handle
+        self.url = url
+
+    def activate(self) -> None:
+        self.session.activate(self.handle)
+
+
+class BrowserSession:
+    """A browser for one Firefox profile that stays open between runs.
+
+    url: the last channel url opened, so a run on the same channel skips navigation entirely.
+    tab_per_server: open each channel url in its own tab and switch tabs instead of navigating.
+    """
+
+    account_name: str
+    firefox_profile: str
+    driver: WebDriver
+    url: str | None
+    runs: int
+    started_at: float
+    tab_per_server: bool
+    tabs: dict[str, Tab]
+    active_handle: str
+
+    def __init__(self, account: "Account", tab_per_server: bool = False) -> None:
+        self.account_name = account.name
+        self.firefox_profile = account.firefox_profile
+        self.driver = account.get_firefox_browser()
+        self.url = None
+        self.runs = 0
+        self.started_at = monotonic()
+        self.tab_per_server = tab_per_server
+        self.tabs = {}
+        self.active_handle = self.driver.current_window_handle
+
+    @property
+    def age_minutes(self) -> float:
+        return (monotonic() - self.started_at) / 60
+
+    def is_alive(self) -> bool:
+        try:
+            self.driver.execute_script("return document.readyState")
+            return True
+        except WebDriverException:
+            return False
+
+    def memory_mb(self) -> float | None:
+        """Resident memory of geckodriver and the Firefox processes under it. None if unknown."""
+        if psutil is None:
+            return None
+        try:
+            root = psutil.Process(self.driver.service.process.pid)
+            processes = [root] + root.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+        except (AttributeError, psutil.Error):
+            return None
+
+    def open(self, url: str) -> Tab:
+        """Shows the channel at url, switching inside the running Discord app when possible."""
+        self.runs += 1
+        if self.tab_per_server:
+            return self._open_tab(url)
+        if self.url != url:
+            if self.url is None or not self._navigate_in_place(url):
+                self.driver.get(url)
+                sleep(Wait.PAGE_LOAD)
+            self.url = url
+        return Tab(self, self.active_handle, url)
+
+    def activate(self, handle: str) -> None:
+        """Switches to the tab. Which tab is active is tracked here, so this is free if it already is."""
+        if handle != self.active_handle:
+            self.driver.switch_to.window(handle)
+            self.active_handle = handle
+
+    def _open_tab(self, url: str) -> Tab:
+        tab = self.tabs.get(url)
+        if tab is not None:
+            tab.activate()
+            return tab
+        if self.tabs:
+            self.driver.switch_to.new_window("tab")
+            self.active_handle = self.driver.current_window_handle
+            logging.info(f"Opening tab {len(self.tabs) + 1} for {self.account_name}")
+        self.driver.get(url)
+        sleep(Wait.PAGE_LOAD)
+        self.url = url
+        tab = Tab(self, self.active_handle, url)
+        self.tabs[url] = tab
+        return tab
+
+    def _navigate_in_place(self, url: str) -> bool:
+        path = urlsplit(url).path
+        channel_id = url.rstrip("/").split("/")[-1]
+        try:
+            self.driver.execute_script(NAVIGATE_IN_PLACE_JS, path)
+            WebDriverWait(self.driver, Wait.NAVIGATE).until(
+                EC.presence_of_element_located(
+                    (By.XPATH, f"//li[starts-with(@id, 'chat-messages-{channel_id}-')]")
+                )
+            )
+            return True
+        except (TimeoutException, WebDriverException):
+            logging.info(f"In place navigation failed for {self.account_name}, reloading")
+            return False
+
+    def quit(self) -> None:
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class SessionManager:
+    """Keeps one warm browser per Firefox profile across scheduled runs.
+
+    memory_limit_mb: restart a browser once it uses more than this. Requires psutil. None to disable.
+    tab_per_server: keep a tab open per server for accounts on several servers, instead of
+        navigating the one tab back and forth
+    """
+
+    memory_limit_mb: int | None
+    tab_per_server: bool
+    _sessions: dict[str, BrowserSession]
+    _held: dict[str, float]
+    _lock: Lock
+
+    def __init__(
+        self, memory_limit_mb: int | None = None, tab_per_server: bool = False
+    ) -> None:
+        self.memory_limit_mb = memory_limit_mb
+        self.tab_per_server = tab_per_server
+        self._sessions = {}
+        self._held = {}
+        self._lock = Lock()
+        if memory_limit_mb is not None and psutil is None:
+            logging.warning("psutil is not installed, browser memory will not be checked")
+
+    def acquire(self, account: "Account") -> BrowserSession:
+        """Returns a healthy browser for the account, starting or restarting one if needed."""
+        with self._lock:
+            session = self._sessions.get(account.firefox_profile)
+        if session is not None and not self._is_healthy(session):
+            session.quit()
+            session = None
+        if session is None:
+            logging.info(f"Starting browser for {account.name}")
+            session = BrowserSession(account, self.tab_per_server)
+            with self._lock:
+                self._sessions[account.firefox_profile] = session
+        return session
+
+    def hold_for_run(self, account: "Account", seconds: float) -> None:
+        """Keeps watches off the account's browser for up to seconds, or until
+        release_for_run, so a run about to start doesn't wait for a watch to finish a check."""
+        with self._lock:
+            self._held[account.firefox_profile] = monotonic() + seconds
+
+    def release_for_run(self, account: "Account") -> None:
+        with self._lock:
+            self._held.pop(account.firefox_profile, None)
+
+    def held_for_run(self, account: "Account") -> bool:
+        with self._lock:
+            return monotonic() < self._held.get(account.firefox_profile, 0)
+
+    def discard(self, account: "Account") -> None:
+        with self._lock:
+            session = self._sessions.pop(account.firefox_profile, None)
+        if session is not None:
+            session.quit()
+
+    def close_all(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.quit()
+
+    def _is_healthy(self, session: BrowserSession) -> bool:
+        if not session.is_alive():
+            logging.warning(f"Browser for {session.account_name} crashed, restarting")
+            return False
+        if self.memory_limit_mb is not None:
+            used = session.memory_mb()
+            if used is not None and used > self.memory_limit_mb:
+                logging.info(
+                    f"Browser for {session.account_name} uses {used:.0f} MB after "
+                    f"{session.runs} runs ({session.age_minutes:.0f} min), restarting"
+                )
+                return False
+        return True
+
+
+__all__ = ["BrowserSession", "SessionManager", "Tab", "profile_lock"]
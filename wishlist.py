@@ -0,0 +1,100 @@
+"""Normalized, hash-indexed lookups for wished characters and series."""
+
+from collections import Counter
+import unicodedata
+
+
+def normalize(text: str) -> str:
+    """Decomposes with Unicode NFKD, casefolds and decomposes again to drop accents, then
+    collapses whitespace, so lookups ignore formatting. The claim agent in page_scripts
+    mirrors this for text that decomposes to ASCII and accents."""
+    decomposed = unicodedata.normalize(
+        "NFKD", unicodedata.normalize("NFKD", text).casefold()
+    )
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.split())
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class WishlistMatcher:
+    """Matches rolled names and series against wishlists with set lookups.
+
+    names: characters that should be claimed
+    series: series from which characters should be claimed
+    aliases: alternate spellings mapped to the name or series they stand for
+    fuzzy_series_threshold: also match series sharing at least this fraction of trigrams
+        with a wished series, from 0 to 1. None to disable.
+    """
+
+    names: frozenset[str]
+    series: frozenset[str]
+    aliases: dict[str, str]
+    fuzzy_series_threshold: float | None
+    _series_trigrams: dict[str, set[str]]
+    _trigram_index: dict[str, list[str]]
+    _fuzzy_results: dict[str, bool]
+
+    def __init__(
+        self,
+        names: list[str] = [],
+        series: list[str] = [],
+        aliases: dict[str, str] = {},
+        fuzzy_series_threshold: float | None = None,
+    ) -> None:
+        self.aliases = {normalize(k): normalize(v) for k, v in aliases.items() if k}
+        self.names = frozenset(self._key(n) for n in names if n.strip())
+        self.series = frozenset(self._key(s) for s in series if s.strip())
+        self.fuzzy_series_threshold = fuzzy_series_threshold
+        self._series_trigrams = {}
+        self._trigram_index = {}
+        self._fuzzy_results = {}
+        if fuzzy_series_threshold is not None:
+            self._build_trigram_index()
+
+    def __len__(self) -> int:
+        return len(self.names) + len(self.series)
+
+    def matches_name(self, name: str) -> bool:
+        return self._key(name) in self.names
+
+    def matches_series(self, series: str, series_lines: list[str] = []) -> bool:
+        """Checks the series as rolled, then each line it was joined from, then fuzzy matches."""
+        key = self._key(series)
+        if key in self.series:
+            return True
+        if any(self._key(line) in self.series for line in series_lines):
+            return True
+        if self.fuzzy_series_threshold is None:
+            return False
+        if key not in self._fuzzy_results:
+            self._fuzzy_results[key] = self._fuzzy_match(key)
+        return self._fuzzy_results[key]
+
+    def _key(self, text: str) -> str:
+        key = normalize(text)
+        return self.aliases.get(key, key)
+
+    def _build_trigram_index(self) -> None:
+        for wished in self.series:
+            grams = trigrams(wished)
+            self._series_trigrams[wished] = grams
+            for gram in grams:
+                self._trigram_index.setdefault(gram, []).append(wished)
+
+    def _fuzzy_match(self, key: str) -> bool:
+        grams = trigrams(key)
+        shared = Counter(
+            wished for gram in grams for wished in self._trigram_index.get(gram, [])
+        )
+        for wished, count in shared.items():
+            union = len(grams) + len(self._series_trigrams[wished]) - count
+            if count / union >= self.fuzzy_series_threshold:
+                return True
+        return False
+
+
+__all__ = ["WishlistMatcher", "normalize"]